@@ -0,0 +1,103 @@
+"""
+Measure the cost of importing qanda.
+
+Each measurement imports qanda in a fresh interpreter and reports the time
+taken by the import itself and which of the heavier dependencies were loaded
+as a side effect. Importing should not load konval or colorama, which are
+only needed once a question is asked. For example::
+
+	% python benchmarks/bench_import.py --runs 20 --budget 15
+
+exits with a non-zero status if the median import time is over the budget
+(in milliseconds) or a deferred dependency was loaded.
+"""
+
+__docformat__ = "restructuredtext en"
+
+
+### IMPORTS
+
+import os
+import sys
+import json
+import subprocess
+from optparse import OptionParser
+
+
+### CONSTANTS & DEFINES
+
+PKG_DIR = os.path.dirname (os.path.dirname (os.path.abspath (__file__)))
+
+DEFERRED_MODULES = ['konval', 'colorama', 'readline']
+
+# run in the child interpreter: time the import, note what was loaded
+CHILD_SCRIPT = """
+import sys, time, json
+t = time.time()
+import qanda
+t = time.time() - t
+print (json.dumps ({
+	'secs': t,
+	'loaded': [m for m in %r if m in sys.modules],
+}))
+""" % (DEFERRED_MODULES,)
+
+DEFAULT_BUDGET_MS = 15.0
+
+
+### IMPLEMENTATION ###
+
+def measure_import (runs, python=sys.executable):
+	"""
+	Import qanda in a number of fresh interpreters, returning the results.
+	"""
+	env = dict (os.environ)
+	env['PYTHONPATH'] = os.pathsep.join ([PKG_DIR] +
+		[p for p in [env.get ('PYTHONPATH')] if p])
+	results = []
+	for i in range (runs):
+		out = subprocess.Popen ([python, '-c', CHILD_SCRIPT], env=env,
+			stdout=subprocess.PIPE).communicate()[0]
+		results.append (json.loads (out))
+	return results
+
+
+def main ():
+	parser = OptionParser (usage="%prog [options]")
+	parser.add_option ('--runs', type='int', default=10,
+		help="number of fresh imports to time")
+	parser.add_option ('--budget', type='float', default=DEFAULT_BUDGET_MS,
+		help="maximum median import time in milliseconds")
+	parser.add_option ('--output', default=None,
+		help="write results as JSON to this file")
+	opts, args = parser.parse_args()
+
+	# the first run may be compiling bytecode, so is discarded
+	results = measure_import (opts.runs + 1)[1:]
+	times = sorted ([r['secs'] * 1000 for r in results])
+	median = times[len (times) // 2]
+	loaded = sorted (set (sum ([r['loaded'] for r in results], [])))
+	summary = {
+		'benchmark': 'import',
+		'runs': opts.runs,
+		'median_ms': median,
+		'min_ms': times[0],
+		'max_ms': times[-1],
+		'budget_ms': opts.budget,
+		'deferred_loaded': loaded,
+	}
+	print ("import qanda: median %.2f ms (min %.2f, max %.2f, budget %.2f)" % (
+		median, times[0], times[-1], opts.budget))
+	if loaded:
+		print ("loaded at import: %s" % ', '.join (loaded))
+	if opts.output:
+		with open (opts.output, 'w') as out_hndl:
+			json.dump (summary, out_hndl, indent=2)
+	return int ((opts.budget < median) or bool (loaded))
+
+
+if __name__ == '__main__':
+	sys.exit (main())
+
+
+### END #######################################################################
@@ -0,0 +1,146 @@
+"""
+Benchmark questions on a real (pseudo-)terminal.
+
+Each type of question is asked over and over by a session in a child process
+on a pseudo-terminal and answered at full speed from the other end (see
+`qanda.ptyharness`), so input goes through `raw_input` and readline and
+styles are chosen and written as on a user's terminal. Each case is run with
+and without styles, and reports the latency from an answer being sent to the
+next prompt and the bytes written per question. For example::
+
+	% python benchmarks/bench_pty.py --output results.json
+	% python benchmarks/bench_pty.py --compare results.json
+
+The second run exits with a non-zero status if any case has become slower,
+or writes more per question, by more than the tolerance (default 20%)
+compared to the first.
+"""
+
+__docformat__ = "restructuredtext en"
+
+
+### IMPORTS
+
+import os
+import sys
+import json
+import time
+import platform
+from optparse import OptionParser
+
+sys.path.insert (0, os.path.dirname (os.path.dirname (os.path.abspath (
+	__file__))))
+
+import qanda
+from qanda.ptyharness import PtyHarness
+
+
+### CONSTANTS & DEFINES
+
+HELP = """This is some help text for the question, long enough to need
+	cleaning up and running over a couple of lines before it is shown."""
+
+CHOICE_SIZES = [10, 100, 1000]
+
+# what is compared with earlier results, and the units shown
+COMPARED = [('usecs_p50', 'us p50'), ('bytes_per_ask', 'bytes/ask')]
+
+
+### IMPLEMENTATION ###
+
+def make_cases (sizes):
+	"""
+	Return the benchmark cases, as (name, ask function, answers).
+	"""
+	cases = [
+		('string', lambda s: s.string ("What is your name", help=HELP,
+			hints="first name", default='Bar'), ['Bob', '']),
+		('integer', lambda s: s.integer ("How old are you", min=1, max=120),
+			['42']),
+		('yesno', lambda s: s.yesno ("Continue", default='y'), ['y', 'n']),
+		('short_choice', lambda s: s.short_choice ("Which", 'abcde'), ['c']),
+	]
+	for n in sizes:
+		choices = [('choice %d' % i, i) for i in range (n)]
+		cases.append (('long_choice_%d' % n,
+			lambda s, choices=choices: s.long_choice ("Pick one", choices),
+			[str (n // 2 + 1)]))
+	return cases
+
+
+def compare (results, baseline, tolerance):
+	"""
+	Return a description of each case that is worse than in the baseline.
+	"""
+	old = dict ([((r['case'], r['styles']), r) for r in baseline['results']])
+	worse = []
+	for r in results:
+		b = old.get ((r['case'], r['styles']))
+		if not b:
+			continue
+		for key, units in COMPARED:
+			if r[key] > b[key] * (1 + tolerance):
+				worse.append ("%s (styles=%s): %.1f %s, was %.1f" % (r['case'],
+					r['styles'], r[key], units, b[key]))
+	return worse
+
+
+def main ():
+	parser = OptionParser (usage="%prog [options]")
+	parser.add_option ('--asks', type='int', default=200,
+		help="number of questions answered in each case")
+	parser.add_option ('--max-choices', type='int', default=CHOICE_SIZES[-1],
+		help="largest long_choice menu to benchmark")
+	parser.add_option ('--no-readline', action='store_true', default=False,
+		help="read answers without readline")
+	parser.add_option ('--case', action='append', default=[],
+		help="only run cases starting with this (may be repeated)")
+	parser.add_option ('--output', default=None,
+		help="write results as JSON to this file")
+	parser.add_option ('--compare', default=None,
+		help="compare against results in this JSON file")
+	parser.add_option ('--tolerance', type='float', default=0.2,
+		help="fractional worsening allowed when comparing")
+	opts, args = parser.parse_args()
+
+	sizes = [n for n in CHOICE_SIZES if n <= opts.max_choices]
+	results = []
+	for name, ask, answers in make_cases (sizes):
+		if opts.case and not [c for c in opts.case if name.startswith (c)]:
+			continue
+		for use_styles in (False, True):
+			with PtyHarness (ask, use_styles=use_styles,
+					readline=not opts.no_readline) as harness:
+				r = harness.run (answers, opts.asks)
+			r.update ({'case': name, 'styles': use_styles})
+			results.append (r)
+			print ("%-20s styles=%-5s %10.1f us p50 %10.1f us p99 "
+				"%10.1f bytes/ask" % (name, use_styles, r['usecs_p50'],
+				r['usecs_p99'], r['bytes_per_ask']))
+
+	summary = {
+		'benchmark': 'pty',
+		'qanda_version': qanda.__version__,
+		'python': platform.python_version(),
+		'styles_available': qanda.defs.get_colorama() is not None,
+		'readline': not opts.no_readline,
+		'timestamp': time.time(),
+		'results': results,
+	}
+	if opts.output:
+		with open (opts.output, 'w') as out_hndl:
+			json.dump (summary, out_hndl, indent=2, sort_keys=True)
+	if opts.compare:
+		with open (opts.compare) as in_hndl:
+			worse = compare (results, json.load (in_hndl), opts.tolerance)
+		for w in worse:
+			print ("WORSE: %s" % w)
+		return int (bool (worse))
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit (main())
+
+
+### END #######################################################################
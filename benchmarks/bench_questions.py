@@ -0,0 +1,239 @@
+"""
+Benchmark the question pipeline.
+
+Each type of question is asked repeatedly of a `Session` fed from a scripted
+input stream, with output going to a sink that counts what was written, so
+the whole of rendering, reading and converting is timed but no terminal is
+involved. Questions are asked with and without styles, and optionally with
+answers taken from an answer source (no rendering at all). For example::
+
+	% python benchmarks/bench_questions.py --output results.json
+	% python benchmarks/bench_questions.py --compare results.json
+
+The second run exits with a non-zero status if any case has slowed by more
+than the tolerance (default 20%) compared to the first.
+
+Allocation per ask is measured with tracemalloc where it is available (Python
+3). Otherwise the growth in the number of objects tracked by the garbage
+collector is reported, which shows any per-ask leak or history growth.
+"""
+
+__docformat__ = "restructuredtext en"
+
+
+### IMPORTS
+
+import os
+import sys
+import gc
+import json
+import time
+import platform
+from optparse import OptionParser
+
+sys.path.insert (0, os.path.dirname (os.path.dirname (os.path.abspath (
+	__file__))))
+
+import qanda
+from qanda import Session
+
+try:
+	import tracemalloc
+except ImportError:
+	tracemalloc = None
+
+
+### CONSTANTS & DEFINES
+
+HELP = """This is some help text for the question, long enough to need
+	cleaning up and running over a couple of lines before it is shown."""
+
+CHOICE_SIZES = [10, 100, 1000, 10000, 100000]
+
+TEXT_ANSWER = ['line %d of some pasted text' % i for i in range (5)] + ['', '']
+
+
+### IMPLEMENTATION ###
+
+class RepeatInput (object):
+	"""
+	An input stream that gives the same lines over and over.
+	"""
+	def __init__ (self, lines):
+		self.lines = ['%s\n' % l for l in lines]
+		self.pos = 0
+
+	def readline (self):
+		line = self.lines[self.pos]
+		self.pos = (self.pos + 1) % len (self.lines)
+		return line
+
+
+class CountingOutput (object):
+	"""
+	An output stream that discards text, counting writes and characters.
+	"""
+	def __init__ (self):
+		self.writes = 0
+		self.chars = 0
+
+	def write (self, text):
+		self.writes += 1
+		self.chars += len (text)
+
+
+def make_cases (sizes):
+	"""
+	Return the benchmark cases, as (name, ask function, answer lines).
+	"""
+	cases = [
+		('string', lambda s: s.string ("What is your name", help=HELP,
+			hints="first name", default='Bar'), ['Bob']),
+		('integer', lambda s: s.integer ("How old are you", min=1, max=120),
+			['42']),
+		('yesno', lambda s: s.yesno ("Continue", default='y'), ['y']),
+		('short_choice', lambda s: s.short_choice ("Which", 'abcde'), ['c']),
+		('text', lambda s: s.text ("Paste some text"), TEXT_ANSWER),
+	]
+	for n in sizes:
+		choices = [('choice %d' % i, i) for i in range (n)]
+		cases.append (('long_choice_%d' % n,
+			lambda s, choices=choices: s.long_choice ("Pick one", choices),
+			[str (n // 2 + 1)]))
+	return cases
+
+
+def run_case (ask, answers, use_styles, use_source, min_time, min_asks):
+	"""
+	Ask a question repeatedly and return measurements.
+
+	Questions are asked in batches until at least `min_time` seconds and
+	`min_asks` asks have passed.
+	"""
+	output = CountingOutput()
+	if use_source:
+		# the answer to each asking, consumed in order
+		def answer_stream():
+			while True:
+				yield '\n'.join (answers[:-2]) if (len (answers) > 1) else answers[0]
+		session = Session (use_styles=use_styles and 'always',
+			answers=answer_stream(), output=output)
+	else:
+		session = Session (use_styles=use_styles and 'always',
+			input=RepeatInput (answers), output=output)
+	# warm up, loading validators and styles
+	ask (session)
+	output.writes = output.chars = 0
+
+	gc.collect()
+	objs_before = len (gc.get_objects())
+	if tracemalloc:
+		tracemalloc.start()
+		alloc_before = tracemalloc.get_traced_memory()[0]
+	asks = 0
+	batch = 1
+	start = time.time()
+	while True:
+		for i in range (batch):
+			ask (session)
+		asks += batch
+		secs = time.time() - start
+		if (min_time <= secs) and (min_asks <= asks):
+			break
+		batch = min (batch * 2, 10000)
+	alloc = None
+	if tracemalloc:
+		alloc = tracemalloc.get_traced_memory()[0] - alloc_before
+		tracemalloc.stop()
+	gc.collect()
+	objs_after = len (gc.get_objects())
+
+	return {
+		'asks': asks,
+		'secs': secs,
+		'asks_per_sec': asks / secs,
+		'usecs_per_ask': secs * 1e6 / asks,
+		'writes_per_ask': float (output.writes) / asks,
+		'chars_per_ask': float (output.chars) / asks,
+		'alloc_bytes_per_ask': float (alloc) / asks if (alloc is not None) else None,
+		'objects_retained_per_ask': float (objs_after - objs_before) / asks,
+	}
+
+
+def compare (results, baseline, tolerance):
+	"""
+	Return a description of each case that is slower than in the baseline.
+	"""
+	old = dict ([((r['case'], r['styles'], r['source']), r)
+		for r in baseline['results']])
+	slower = []
+	for r in results:
+		b = old.get ((r['case'], r['styles'], r['source']))
+		if b and (r['usecs_per_ask'] > b['usecs_per_ask'] * (1 + tolerance)):
+			slower.append ("%s (styles=%s, source=%s): %.1f us/ask, was %.1f" % (
+				r['case'], r['styles'], r['source'], r['usecs_per_ask'],
+				b['usecs_per_ask']))
+	return slower
+
+
+def main ():
+	parser = OptionParser (usage="%prog [options]")
+	parser.add_option ('--min-time', type='float', default=0.5,
+		help="minimum seconds to run each case for")
+	parser.add_option ('--min-asks', type='int', default=3,
+		help="minimum number of asks for each case")
+	parser.add_option ('--max-choices', type='int', default=CHOICE_SIZES[-1],
+		help="largest long_choice menu to benchmark")
+	parser.add_option ('--case', action='append', default=[],
+		help="only run cases starting with this (may be repeated)")
+	parser.add_option ('--output', default=None,
+		help="write results as JSON to this file")
+	parser.add_option ('--compare', default=None,
+		help="compare against results in this JSON file")
+	parser.add_option ('--tolerance', type='float', default=0.2,
+		help="fractional slowdown allowed when comparing")
+	opts, args = parser.parse_args()
+
+	sizes = [n for n in CHOICE_SIZES if n <= opts.max_choices]
+	results = []
+	for name, ask, answers in make_cases (sizes):
+		if opts.case and not [c for c in opts.case if name.startswith (c)]:
+			continue
+		for use_source in (False, True):
+			for use_styles in (False, True):
+				if use_source and use_styles:
+					# nothing is rendered, so styles make no difference
+					continue
+				r = run_case (ask, answers, use_styles, use_source, opts.min_time,
+					opts.min_asks)
+				r.update ({'case': name, 'styles': use_styles, 'source': use_source})
+				results.append (r)
+				print ("%-20s styles=%-5s source=%-5s %12.1f asks/s %10.1f us/ask "
+					"%6.1f writes/ask" % (name, use_styles, use_source,
+					r['asks_per_sec'], r['usecs_per_ask'], r['writes_per_ask']))
+
+	summary = {
+		'benchmark': 'questions',
+		'qanda_version': qanda.__version__,
+		'python': platform.python_version(),
+		'styles_available': qanda.defs.get_colorama() is not None,
+		'timestamp': time.time(),
+		'results': results,
+	}
+	if opts.output:
+		with open (opts.output, 'w') as out_hndl:
+			json.dump (summary, out_hndl, indent=2, sort_keys=True)
+	if opts.compare:
+		with open (opts.compare) as in_hndl:
+			slower = compare (results, json.load (in_hndl), opts.tolerance)
+		for s in slower:
+			print ("SLOWER: %s" % s)
+		return int (bool (slower))
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit (main())
+
+
+### END #######################################################################
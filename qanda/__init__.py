@@ -40,12 +40,80 @@ __email__ = "pma@agapow.net"
 
 ### IMPORTS
 
+import sys
+import types
+
 from session import *
+from question import *
+from errors import *
+from observers import *
+from convert import *
 
 
 ### CONSTANTS & DEFINES
 
+# Names from submodules that are only imported when first used. The sessions,
+# questions and errors are always needed, but answer sources, async sessions
+# and choice indexes are not, and importing them would slow every startup.
+LAZY_NAMES = {
+	'AnswerSource':         'answers',
+	'SequenceAnswers':      'answers',
+	'MappingAnswers':       'answers',
+	'load_answers':         'answers',
+	'make_answer_source':   'answers',
+	'AsyncSession':         'asyncsession',
+	'PendingAnswer':        'asyncsession',
+	'ChoiceIndex':          'choices',
+	'LazyChoices':          'choices',
+	'SessionRecorder':      'replay',
+	'ReplaySession':        'replay',
+	'ReplayError':          'replay',
+	'load_log':             'replay',
+	'replay_log':           'replay',
+	'Form':                 'form',
+	'AnswerStore':          'store',
+	'PromptServer':         'server',
+	'PromptClient':         'server',
+	'ServerError':          'server',
+	'SortedCompleter':      'completion',
+	'AnswerHistory':        'history',
+	'AnswerRecord':         'history',
+	'PtyHarness':           'ptyharness',
+	'HarnessError':         'ptyharness',
+}
+
+
 ### IMPLEMENTATION ###
 
+class _LazyModule (types.ModuleType):
+	"""
+	This package, loading submodules when their contents are first asked for.
+	"""
+	def __getattr__ (self, name):
+		submod = LAZY_NAMES.get (name)
+		if submod is None:
+			raise AttributeError ("'module' object has no attribute '%s'" % name)
+		__import__ ('%s.%s' % (self.__name__, submod))
+		val = getattr (getattr (self, submod), name)
+		setattr (self, name, val)
+		return val
+
+
+def _make_lazy (name):
+	old_mod = sys.modules[name]
+	new_mod = _LazyModule (name, old_mod.__doc__)
+	new_mod.__dict__.update (old_mod.__dict__)
+	# keep the original alive, as Python clears the globals of a module (which
+	# are those used by the functions here) when it is collected
+	new_mod._old_mod = old_mod
+	sys.modules[name] = new_mod
+
+# the lazy names are left out, as a star import would load every submodule
+__all__ = session.__all__ + question.__all__ + errors.__all__ + \
+	observers.__all__ + convert.__all__
+
+_make_lazy (__name__)
+
+
 ### END #######################################################################
 
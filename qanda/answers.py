@@ -0,0 +1,175 @@
+"""
+Sources of answers for running sessions without a user.
+
+A session given an answer source takes its answers from there rather than
+prompting on the terminal. Answers are still processed exactly as typed
+answers are (stripping, defaults and converters) but nothing is printed, so
+scripts can be run unattended::
+
+	from qanda import Session
+	s = Session (answers={'name': 'Bob', 'How old are you': '42'})
+	s.string ("What is your name", qid='name')
+	s.integer ("How old are you")
+
+Answers can be keyed by the question id (if the question was given one) or
+the text of the question, or simply given in order.
+"""
+
+__docformat__ = "restructuredtext en"
+
+
+### IMPORTS
+
+import os
+
+__all__ = [
+	'AnswerSource',
+	'SequenceAnswers',
+	'MappingAnswers',
+	'load_answers',
+	'make_answer_source',
+]
+
+
+### CONSTANTS & DEFINES
+
+### IMPLEMENTATION ###
+
+class AnswerSource (object):
+	"""
+	Base class for answer sources.
+
+	Subclasses need only override `get`.
+	"""
+
+	def get (self, q):
+		"""
+		Return the raw answer for a question, or None if there isn't one.
+
+		:Parameters:
+			q
+				The `Question` being asked.
+
+		Answers are returned as strings, as if they had been typed.
+		"""
+		raise NotImplementedError()
+
+
+class SequenceAnswers (AnswerSource):
+	"""
+	Answers given in order, irrespective of the question.
+
+	This is the equivalent of piping lines to a program, but with no danger of
+	prompts and answers getting out of step with the terminal. Any iterable can
+	be used and is consumed lazily, so a file or generator can supply answers.
+	"""
+
+	def __init__ (self, answers):
+		self._answers = iter (answers)
+
+	def get (self, q):
+		return _to_raw (next (self._answers, None))
+
+
+class MappingAnswers (AnswerSource):
+	"""
+	Answers looked up by question id or question text.
+
+	If the question has an id, that is looked up first and then the text of the
+	question. If an answer is a list or tuple, each asking of the question
+	consumes the next answer in it. Otherwise the same answer is given every
+	time the question is asked.
+	"""
+
+	def __init__ (self, answers):
+		self._answers = {}
+		for k, v in answers.items():
+			if isinstance (v, (list, tuple)):
+				v = iter (v)
+			self._answers[k] = v
+
+	def get (self, q):
+		for k in (q.qid, q.question):
+			if (k is not None) and (k in self._answers):
+				a = self._answers[k]
+				if hasattr (a, 'next'):
+					a = next (a, None)
+				return _to_raw (a)
+		return None
+
+
+def _to_raw (answer):
+	"""
+	Return an answer as a raw string, as if typed.
+	"""
+	if (answer is None) or isinstance (answer, basestring):
+		return answer
+	return '%s' % answer
+
+
+def load_answers (path, format=None):
+	"""
+	Read answers from a JSON, YAML or CSV file.
+
+	:Parameters:
+		path
+			The path to the file.
+		format
+			One of 'json', 'yaml' or 'csv'. If not given, it is taken from the file
+			extension.
+
+	JSON and YAML files may hold either a mapping of question ids or text to
+	answers, or a list of answers in order. CSV files may hold rows of key and
+	answer or single column of answers in order. Reading YAML requires PyYAML.
+	"""
+	## Preconditions:
+	if format is None:
+		format = os.path.splitext (path)[1][1:]
+	format = format.lower()
+	if format == 'yml':
+		format = 'yaml'
+	assert format in ('json', 'yaml', 'csv'), \
+		"unrecognised answer file format '%s'" % format
+
+	## Main:
+	if format == 'csv':
+		import csv
+		answers = {}
+		with open (path, 'rb') as in_hndl:
+			rows = [r for r in csv.reader (in_hndl) if r]
+		if rows and (len (rows[0]) == 1):
+			return SequenceAnswers ([r[0] for r in rows])
+		for r in rows:
+			answers.setdefault (r[0], []).append (r[1])
+		return MappingAnswers (answers)
+	with open (path, 'rb') as in_hndl:
+		if format == 'json':
+			import json
+			answers = json.load (in_hndl)
+		else:
+			import yaml
+			answers = yaml.safe_load (in_hndl)
+
+	## Postconditions & return:
+	return make_answer_source (answers)
+
+
+def make_answer_source (answers):
+	"""
+	Return an answer source for a variety of answer formats.
+
+	A dictionary gives a `MappingAnswers`, a string is taken to be the path to a
+	file and read by `load_answers`, an existing `AnswerSource` is returned
+	unchanged and any other iterable gives `SequenceAnswers`.
+	"""
+	if isinstance (answers, AnswerSource):
+		return answers
+	if isinstance (answers, dict):
+		return MappingAnswers (answers)
+	if isinstance (answers, basestring):
+		return load_answers (answers)
+	return SequenceAnswers (answers)
+
+
+
+### END #######################################################################
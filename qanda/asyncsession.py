@@ -0,0 +1,382 @@
+"""
+Sessions that are driven by incoming data, rather than blocking for input.
+
+A normal `Session` blocks while waiting for the user to answer, so a process
+can only hold one conversation at a time. An `AsyncSession` instead returns a
+`PendingAnswer` from each question and is fed input as it arrives (e.g. from
+a socket or pseudo-terminal handled by an event loop), so a single thread can
+serve many sessions at once.
+
+The simplest way to write a conversation is as a generator that yields each
+pending answer and is sent the answer back::
+
+	def conversation (session):
+		name = yield session.string ("What is your name")
+		age = yield session.integer ("How old are you", min=1)
+		raise StopIteration ((name, age))
+
+	s = AsyncSession (write=sock.send)
+	result = s.run (conversation (s))
+	...
+	# as data arrives from the socket
+	s.feed (data)
+
+Answers are processed and validated exactly as in a normal session, with bad
+answers leading to the question being re-asked. Long choices are shown a page
+at a time, and can be paged through and searched, as in a normal session.
+
+A session can't wait for input itself, so timeouts and deadlines are applied
+by whatever feeds it. `time_left` gives how long it may wait for input, and
+`expire` should be called after that, as `PromptServer` does::
+
+	ready = select.select ([sock], [], [], s.time_left())[0]
+	if ready:
+		s.feed (sock.recv (4096))
+	s.expire()
+"""
+
+__docformat__ = "restructuredtext en"
+
+
+### IMPORTS
+
+import time
+from collections import deque
+
+from session import Session, _MultilineText, SEARCH_PAGES
+from question import ChoiceQuestion
+from errors import ConversionError, TooManyAttempts, InputTimeout
+
+__all__ = [
+	'AsyncSession',
+	'PendingAnswer',
+]
+
+
+### CONSTANTS & DEFINES
+
+### IMPLEMENTATION ###
+
+class PendingAnswer (object):
+	"""
+	The answer to a question that has been asked but not necessarily answered.
+
+	Callbacks can be registered to be called with the answer once it arrives.
+	If it has already arrived, they are called immediately.
+	"""
+
+	def __init__ (self, question=None):
+		self.question = question
+		self.done = False
+		self.value = None
+		self.error = None
+		self.attempts = []
+		self._callbacks = []
+
+	def add_callback (self, fn):
+		"""
+		Register a function to be called with this when it is done.
+		"""
+		if self.done:
+			fn (self)
+		else:
+			self._callbacks.append (fn)
+
+	def result (self):
+		"""
+		Return the answer, or raise the error if the question failed.
+		"""
+		assert self.done, "answer to '%s' is not yet available" % self.question
+		if self.error is not None:
+			raise self.error
+		return self.value
+
+	def _finish (self, value=None, error=None):
+		self.done = True
+		self.value = value
+		self.error = error
+		callbacks, self._callbacks = self._callbacks, []
+		for fn in callbacks:
+			fn (self)
+
+	def __repr__ (self):
+		return "<%s %r%s>" % (self.__class__.__name__,
+			getattr (self.question, 'question', self.question),
+			self.done and " done" or "")
+
+
+class AsyncSession (Session):
+	"""
+	A session that is fed input, rather than reading it.
+
+	Questions are asked in the order they are posed. Only one is shown at a
+	time: once it is answered, the next one waiting (if any) is shown.
+	"""
+
+	def __init__ (self, write=None, **kwargs):
+		"""
+		C'tor.
+
+		:Parameters:
+			write
+				A function to be called with all text to be shown to the user.
+				By default, this is written to the session output stream.
+
+		Other arguments are as for `Session`.
+		"""
+		Session.__init__ (self, **kwargs)
+		if write is not None:
+			self.write = write
+		self._waiting = deque()
+		self._partial = ''
+		self._lines = None
+		# the listing and start of the page of choices shown, if any
+		self._page = None
+		# when the question shown must be answered by, and its timeout
+		self._expires = None
+		self._timeout = None
+		self.closed = False
+
+	@property
+	def current (self):
+		"""
+		The question waiting for an answer, or None if there is none.
+		"""
+		if self._waiting:
+			return self._waiting[0].question
+		return None
+
+	def feed (self, data):
+		"""
+		Pass input to the session.
+
+		Input need not be a whole line: it is buffered until a line is complete
+		and then used to answer the current question. Input arriving when no
+		question is waiting is discarded.
+		"""
+		lines = (self._partial + data).split ('\n')
+		self._partial = lines.pop()
+		for line in lines:
+			if self._waiting:
+				self._receive_line (line.rstrip ('\r'))
+
+	def time_left (self):
+		"""
+		Return the seconds left to answer the question shown.
+
+		This is None if there is no question, or no limit on answering it. As
+		in a normal session, the question's (or else the session's) timeout
+		applies to each attempt at answering, and the deadline to all.
+		"""
+		if self._expires is None:
+			return None
+		return max (self._expires - time.time(), 0)
+
+	def expire (self):
+		"""
+		End the question shown if its time to answer has run out.
+
+		As in a normal session, the question is answered with its default, or
+		fails with an `InputTimeout` if it has none. Returns whether the time
+		had run out.
+		"""
+		if (self._expires is None) or (time.time() < self._expires):
+			return False
+		pending = self._waiting[0]
+		q = pending.question
+		self._expires = None
+		# finish the prompt line
+		self.write ('\n')
+		if (q.default is None) and (q.default_value is None):
+			self._next_question()
+			self._fail (pending, InputTimeout (q.question, self._timeout))
+			return True
+		if q.multiline:
+			# any lines so far are dropped, for a blank answer
+			self._lines = _MultilineText (q.terminator, q.max_size)
+		self._partial = ''
+		self._receive_line ('')
+		return True
+
+	def close (self):
+		"""
+		Signal the end of input, failing any unanswered questions with EOFError.
+		"""
+		self.closed = True
+		self._expires = None
+		waiting, self._waiting = self._waiting, deque()
+		for pending in waiting:
+			self._fail (pending, EOFError ("input closed before answer"))
+
+	def run (self, coroutine):
+		"""
+		Drive a conversation written as a generator.
+
+		:Parameters:
+			coroutine
+				A generator that yields `PendingAnswer`s and is sent the answer
+				to each in turn. If a question fails, the error is thrown into
+				the generator. The generator can give a result by raising
+				StopIteration with it.
+
+		Returns a `PendingAnswer` for the result of the whole conversation.
+		"""
+		result = PendingAnswer()
+		def step (pending=None):
+			# loop rather than recurse through answers that are already available
+			while True:
+				try:
+					if pending is None:
+						pending = coroutine.send (None)
+					elif pending.error is not None:
+						pending = coroutine.throw (pending.error)
+					else:
+						pending = coroutine.send (pending.value)
+				except StopIteration, err:
+					result._finish (err.args[0] if err.args else None)
+					return
+				except Exception, err:
+					result._finish (error=err)
+					return
+				if not pending.done:
+					pending.add_callback (step)
+					return
+		step()
+		return result
+
+	## Internals
+	def _ask_question (self, q):
+		pending = PendingAnswer (q)
+		if self.observers:
+			self._notify ('question_asked', q)
+		if self.answers is not None:
+			try:
+				pending._finish (self._answer_from_source (q))
+			except Exception, err:
+				self._fail (pending, err)
+		elif self.closed:
+			self._fail (pending, EOFError ("input closed before answer"))
+		else:
+			self._waiting.append (pending)
+			if len (self._waiting) == 1:
+				self._show_question (q)
+		return pending
+
+	# choice questions are paged when shown and answered
+	_ask_choice_question = _ask_question
+
+	def _show_question (self, q, leadin=True, error=None, page=False):
+		shown = ''
+		if error is not None:
+			shown = self._format_error (error)
+		elif leadin and q.leadin:
+			shown = q.leadin + '\n'
+		if leadin and isinstance (q, ChoiceQuestion):
+			# as per Session._ask_choice_question, start on the first page of all
+			self._page = (None, 0)
+			page = True
+		if page:
+			listing, start = self._page
+			shown += self._render_choice_page (q.index, listing, start,
+				q.page_size) + '\n'
+		self.write (shown + q.question_str + ' ')
+		if self.observers:
+			self._notify ('prompt_rendered', q, shown + q.question_str)
+		if q.multiline:
+			self._lines = _MultilineText (q.terminator, q.max_size)
+		self._start_timer (q)
+
+	def _start_timer (self, q):
+		# as per Session._read_answer
+		timeout = q.timeout
+		if timeout is None:
+			timeout = self.timeout
+		now = time.time()
+		deadline = self.deadline
+		if deadline is not None:
+			left = max (deadline - now, 0)
+			if (timeout is None) or (left < timeout):
+				timeout = left
+		self._timeout = timeout
+		self._expires = None
+		if timeout is not None:
+			self._expires = now + timeout
+
+	def _receive_line (self, line):
+		pending = self._waiting[0]
+		q = pending.question
+		raw_answer = line
+		is_choice = isinstance (q, ChoiceQuestion)
+		if is_choice and (line.strip() in ('>', '<')):
+			self._turn_page (q, line.strip())
+			return
+		try:
+			if q.multiline:
+				# as per read_input_multiline
+				if not self._lines.add (line):
+					self.write ('... ')
+					return
+				raw_answer = None
+				raw_answer = self._lines.result (q.as_lines)
+				self._lines = None
+			value = self._process_answer (q, raw_answer)
+		except ConversionError, err:
+			text = is_choice and line.strip()
+			matches = text and q.index.search (text, SEARCH_PAGES * q.page_size)
+			if matches:
+				self._page = (matches, 0)
+				self._show_question (q, leadin=False, page=True)
+				return
+			try:
+				self._failed_attempt (q, raw_answer, err, pending.attempts)
+			except TooManyAttempts, fail:
+				self._next_question()
+				self._fail (pending, fail)
+				return
+			self._show_question (q, leadin=False, error=err)
+			return
+		self._next_question()
+		pending._finish (value)
+
+	def _turn_page (self, q, text):
+		"""
+		Show the next ('>') or previous ('<') page of choices, if there is one.
+		"""
+		listing, start = self._page
+		step = (text == '>') and q.page_size or -q.page_size
+		new_start = start + step
+		if listing is None:
+			has_page = q.index.rows (new_start, new_start + 1)
+		else:
+			has_page = new_start < len (listing)
+		if (0 <= new_start) and has_page:
+			self._page = (listing, new_start)
+			self._show_question (q, leadin=False, page=True)
+		else:
+			self._show_question (q, leadin=False)
+
+	def _fail (self, pending, err):
+		"""
+		End a question with an error, telling any observers.
+		"""
+		if self.observers:
+			self._notify ('question_failed', pending.question, err)
+		pending._finish (error=err)
+
+	def _next_question (self):
+		self._waiting.popleft()
+		self._expires = None
+		if self._waiting:
+			self._show_question (self._waiting[0].question)
+
+	def _run_offloaded (self, conv, value):
+		# waiting on a pool would block feeding as much as converting does
+		return conv (value)
+
+	def _input_is_tty (self):
+		# fed input is never directly from a terminal
+		return False
+
+
+
+### END #######################################################################
@@ -0,0 +1,228 @@
+"""
+Processing many answers to a question at once.
+
+Questions can be used to validate imported data as well as answers typed by
+a user, e.g. a column of a CSV file of answers::
+
+	q = prompt.compile ('integer', "Age", min=0, max=150)
+	values, errors = prompt.validate_many (q, ages)
+
+Asking a question once per row would be very slow, so here the answers are
+cleaned and converted as a batch. The chains of the built-in question types
+are replaced by faster equivalents: integers are parsed and range-checked in
+bulk with NumPy (if it is available), and choices are looked up directly in
+their tables. Other questions have their chain called on each answer.
+"""
+
+__docformat__ = "restructuredtext en"
+
+
+### IMPORTS
+
+import defs
+from convert import ChoiceLookup
+
+__all__ = [
+	'validate_many',
+]
+
+
+### CONSTANTS & DEFINES
+
+# the longest run of digits that always fits in a 64-bit integer
+MAX_FAST_DIGITS = 18
+
+# the bytes of an integer
+ZERO, NINE, PLUS, MINUS = [ord (c) for c in '09+-']
+
+
+### IMPLEMENTATION ###
+
+def get_numpy ():
+	"""
+	Return the numpy module, or None if it is not available.
+
+	NumPy is imported on the first call.
+	"""
+	return defs.import_optional ('numpy')
+
+
+def validate_many (q, answers):
+	"""
+	Clean, default and convert many raw answers to a question.
+
+	:Parameters:
+		q
+			The `Question` answered.
+		answers
+			A sequence of raw answers. As per `Form.validate`, answers that
+			aren't strings (e.g. numbers from JSON) are converted from their
+			string form, and None is a missing answer.
+
+	Returns a list of the converted values, with None for answers that failed,
+	and a bytearray with 1 for each answer that failed and 0 for the rest.
+	"""
+	## Preconditions:
+	assert not q.multiline, "can't validate many answers to multiline text"
+	## Main:
+	raws = list (answers)
+	missing = []
+	for i, a in enumerate (raws):
+		if not isinstance (a, basestring):
+			if a is None:
+				# a missing answer takes any default, as a blank one does
+				missing.append (i)
+				raws[i] = ''
+			else:
+				raws[i] = '%s' % a
+	if q.strip_flanking_space:
+		raws = [a.strip() for a in raws]
+	# as per Session._process_answer, blank answers take the default
+	preset = []
+	if (q.default is not None) or (q.default_value is not None):
+		for i, a in enumerate (raws):
+			if a == '':
+				if q.default_value is not None:
+					preset.append (i)
+				else:
+					raws[i] = q.default
+	chain = q.convert
+	kind = getattr (chain, 'kind', None)
+	if kind and (kind[0] == 'integer'):
+		values, mask = _convert_ints (raws, kind[1], kind[2])
+	elif (len (chain) == 1) and isinstance (q.converters[0], ChoiceLookup):
+		values, mask = _lookup_all (q.converters[0], raws)
+	else:
+		values, mask = _convert_each (chain, raws)
+	## Postconditions & return:
+	for i in preset:
+		values[i] = q.default_value
+		mask[i] = 0
+	if (q.default is None) and (q.default_value is None):
+		for i in missing:
+			values[i] = None
+			mask[i] = 1
+	return values, mask
+
+
+def _convert_ints (raws, min, max):
+	"""
+	Convert answers to integers within an (optional) range.
+
+	With NumPy, the answers that are plainly a (not too long) number are parsed
+	and checked together, and only the rest are tried one by one.
+	"""
+	## Preconditions:
+	n = len (raws)
+	values = [None] * n
+	mask = bytearray (n)
+	slow = xrange (n)
+	np = get_numpy()
+	## Main:
+	if n and (np is not None):
+		fast, nums = _parse_ints (np, raws)
+		bad = ~fast
+		if min is not None:
+			bad |= (nums < min)
+		if max is not None:
+			bad |= (nums > max)
+		values = nums.tolist()
+		for i in np.flatnonzero (bad).tolist():
+			values[i] = None
+		for i in np.flatnonzero (fast & bad).tolist():
+			mask[i] = 1
+		slow = np.flatnonzero (~fast).tolist()
+	for i in slow:
+		try:
+			v = int (raws[i])
+		except (ValueError, TypeError):
+			mask[i] = 1
+			continue
+		if ((min is not None) and (v < min)) or ((max is not None) and (max < v)):
+			mask[i] = 1
+		else:
+			values[i] = v
+	## Postconditions & return:
+	return values, mask
+
+
+def _parse_ints (np, raws):
+	"""
+	Parse the answers that are plainly integers, with NumPy.
+
+	The answers are laid out as rows of bytes, and those that are only ascii
+	digits (with at most a leading sign) are parsed a column at a time.
+	Returns an array of which answers were parsed, and one of their values.
+	"""
+	## Preconditions:
+	n = len (raws)
+	fast = np.zeros (n, bool)
+	nums = np.zeros (n, np.int64)
+	try:
+		strs = np.array (raws)
+		if strs.dtype.kind != 'S':
+			strs = strs.astype ('S')
+	except (UnicodeError, ValueError, TypeError):
+		return fast, nums
+	## Main:
+	width = strs.dtype.itemsize
+	cols = strs.view (np.uint8).reshape (n, width)
+	# room for a sign, and any longer answers are left to int
+	max_width = MAX_FAST_DIGITS + 1
+	if max_width < width:
+		too_long = cols[:, max_width] != 0
+		cols = cols[:, :max_width]
+	else:
+		too_long = fast
+	is_digit = (ZERO <= cols) & (cols <= NINE)
+	is_end = (cols == 0)
+	has_sign = (cols[:, 0] == PLUS) | (cols[:, 0] == MINUS)
+	fast = (is_digit | is_end).all (1)
+	fast |= has_sign & (is_digit[:, 1:] | is_end[:, 1:]).all (1)
+	fast &= is_digit.any (1) & ~too_long
+	# nothing may follow the end of an answer
+	fast &= ~(is_end[:, :-1] & ~is_end[:, 1:]).any (1)
+	for j in xrange (cols.shape[1]):
+		nums = np.where (is_digit[:, j], nums * 10 + (cols[:, j] - ZERO), nums)
+	nums = np.where (cols[:, 0] == MINUS, -nums, nums)
+	nums[~fast] = 0
+	## Postconditions & return:
+	return fast, nums
+
+
+def _lookup_all (lookup, raws):
+	"""
+	Convert answers by looking them up in the table of a `ChoiceLookup`.
+	"""
+	get = lookup.table.get
+	missing = object()
+	values = [get (a, missing) for a in raws]
+	mask = bytearray (len (values))
+	for i, v in enumerate (values):
+		if v is missing:
+			if lookup.fold_case and isinstance (raws[i], basestring):
+				v = get (raws[i].lower(), missing)
+			if v is missing:
+				v = None
+				mask[i] = 1
+			values[i] = v
+	return values, mask
+
+
+def _convert_each (chain, raws):
+	"""
+	Convert answers by calling a converter chain on each.
+	"""
+	values = [None] * len (raws)
+	mask = bytearray (len (raws))
+	for i, a in enumerate (raws):
+		try:
+			values[i] = chain (a)
+		except Exception:
+			# as per Session._process_answer, any error fails the answer
+			mask[i] = 1
+	return values, mask
+
+
+
+### END #######################################################################
@@ -0,0 +1,357 @@
+"""
+Indexes for choosing from very long lists.
+
+Listing every choice and checking answers against a list is fine for a menu
+of a dozen items, but not for tens of thousands. A `ChoiceIndex` is built once
+from the choices and allows them to be looked up by number, label or value in
+constant time, searched by prefix via a sorted array and searched for close
+matches via an index of the n-grams in the labels::
+
+	hosts = ChoiceIndex (all_hosts)
+	host = prompt.long_choice ("Which host", hosts)
+
+When a `ChoiceIndex` is passed to `Session.long_choice`, only a page of the
+choices are shown at a time and the user can type part of a label to filter
+them.
+
+Where there are too many choices to hold in memory (e.g. the rows of a
+database query), `LazyChoices` fetches only the choices being shown or
+selected, from an iterable or a function that returns a page of choices::
+
+	def fetch_hosts (start, count):
+		cursor.execute ("SELECT name, id FROM hosts LIMIT ? OFFSET ?",
+			(count, start))
+		return cursor.fetchall()
+
+	host = prompt.long_choice ("Which host", LazyChoices (fetch_hosts))
+
+Both classes provide the same methods for showing and selecting choices
+(`total`, `rows`, `label`, `convert` and `search`), which is all that
+`Session.long_choice` requires.
+"""
+
+__docformat__ = "restructuredtext en"
+
+
+### IMPORTS
+
+import heapq
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+__all__ = [
+	'ChoiceIndex',
+	'LazyChoices',
+]
+
+
+### CONSTANTS & DEFINES
+
+DEFAULT_PAGE_SIZE = 20
+
+
+### IMPLEMENTATION ###
+
+class ChoiceIndex (object):
+	"""
+	An index of choices for fast lookup and searching.
+
+	As with `Session.long_choice`, a choice is a string or a pair of strings. If
+	a pair is provided, the first is the visible label, the second the actual
+	returned value. Choices are numbered from 1 in the order given. Lookup and
+	searching ignore case.
+	"""
+
+	def __init__ (self, choices, ngram=3):
+		"""
+		C'tor.
+
+		:Parameters:
+			choices
+				A sequence of choices.
+			ngram
+				The length of the substrings indexed for fuzzy searching.
+		"""
+		## Preconditions:
+		assert choices, "need choices for index"
+		## Main:
+		from konval.impl import make_list
+		self.labels = []
+		self.values = []
+		self.ngram = ngram
+		self._exact = {}
+		for c in choices:
+			c = make_list (c)
+			self.labels.append ('%s' % c[0])
+			self.values.append (c[-1])
+		# number of choice for each (lowered) value and then label, so labels
+		# take precedence
+		for i, v in enumerate (self.values):
+			self._exact.setdefault (('%s' % v).lower(), i)
+		for i, l in enumerate (self.labels):
+			self._exact[l.lower()] = i
+		# sorted labels for prefix search
+		order = sorted (range (len (self.labels)),
+			key=lambda i: self.labels[i].lower())
+		self._sorted_keys = [self.labels[i].lower() for i in order]
+		self._sorted_idx = array ('i', order)
+		# substrings of labels for fuzzy search
+		self._grams = {}
+		for i, l in enumerate (self.labels):
+			for g in set (self._split_grams (l.lower())):
+				self._grams.setdefault (g, array ('i')).append (i)
+
+	def __len__ (self):
+		return len (self.labels)
+
+	def total (self):
+		"""
+		Return the number of choices.
+		"""
+		return len (self.labels)
+
+	def label (self, i):
+		"""
+		Return the label of a choice, by (0-based) index.
+		"""
+		return self.labels[i]
+
+	def rows (self, start, stop):
+		"""
+		Return the index and label of a range of choices, in order.
+		"""
+		return [(i, self.labels[i]) for i in
+			xrange (start, min (stop, len (self.labels)))]
+
+	def lookup (self, text):
+		"""
+		Return the index of the choice selected by some text, or None.
+
+		The text may be the number of the choice, its label or its value.
+		"""
+		text = text.strip()
+		if text.isdigit():
+			n = int (text)
+			if 1 <= n <= len (self.labels):
+				return n - 1
+		return self._exact.get (text.lower())
+
+	def convert (self, text):
+		"""
+		Return the value of the choice selected by some text.
+
+		This is suitable for use as a converter and raises a ValueError if the
+		text does not select a choice.
+		"""
+		i = self.lookup (text)
+		if i is None:
+			raise ValueError ("'%s' is not one of the choices" % text)
+		return self.values[i]
+
+	def prefixed (self, text, limit=None):
+		"""
+		Return the indices of choices with labels starting with some text.
+
+		Choices are returned in alphabetical order of label.
+		"""
+		text = text.lower()
+		start = bisect_left (self._sorted_keys, text)
+		matches = []
+		for pos in xrange (start, len (self._sorted_keys)):
+			if (limit is not None) and (limit <= len (matches)):
+				break
+			if not self._sorted_keys[pos].startswith (text):
+				break
+			matches.append (self._sorted_idx[pos])
+		return matches
+
+	def complete (self, text, limit=None):
+		"""
+		Return the labels of choices starting with some text, for completion.
+		"""
+		labels = self.labels
+		return [labels[i] for i in self.prefixed (text, limit)]
+
+	def search (self, text, limit=None):
+		"""
+		Return the indices of choices with labels resembling some text.
+
+		Choices with labels starting with the text come first, followed by those
+		sharing the most n-grams with the text (and at least half of them). Texts
+		shorter than the n-gram length are only matched as prefixes. Given a
+		limit, the search stops once that many of the best matches are found.
+		"""
+		matches = self.prefixed (text, limit)
+		if (limit is not None) and (limit <= len (matches)):
+			return matches
+		grams = set (self._split_grams (text.lower()))
+		if not grams:
+			return matches
+		# a choice matching enough n-grams must contain at least one of the
+		# rarest ones, so only those are scanned for candidates
+		grams = sorted (grams, key=lambda g: len (self._grams.get (g, ())))
+		threshold = (len (grams) + 1) // 2
+		postings = [self._grams.get (g, ())
+			for g in grams[:len (grams) - threshold + 1]]
+		if limit is None:
+			candidates = set()
+			for p in postings:
+				candidates.update (p)
+		else:
+			# in order, so the search can stop early
+			candidates = heapq.merge (*postings)
+		seen = set (matches)
+		counts = {}
+		complete = 0
+		last = None
+		for i in candidates:
+			if (i == last) or (i in seen):
+				continue
+			last = i
+			label = self.labels[i].lower()
+			n = sum ([1 for g in grams if g in label])
+			if threshold <= n:
+				counts[i] = n
+				if n == len (grams):
+					# nothing can outrank these, nor later ones equal them
+					complete += 1
+					if (limit is not None) and (limit <= len (matches) + complete):
+						break
+		fuzzy = counts.keys()
+		fuzzy.sort (key=lambda i: (-counts[i], i))
+		matches.extend (fuzzy)
+		if limit is not None:
+			matches = matches[:limit]
+		return matches
+
+	def _split_grams (self, text):
+		n = self.ngram
+		return [text[i:i+n] for i in xrange (len (text) - n + 1)]
+
+
+class LazyChoices (object):
+	"""
+	Choices that are fetched as needed, rather than held in memory.
+
+	Choices are numbered from 1 in the order they are supplied. Only a window
+	of recently fetched choices is kept. Choices can be selected by number or,
+	if it is in the window, by label or value. There is no searching.
+	"""
+
+	def __init__ (self, source, total=None, block_size=DEFAULT_PAGE_SIZE,
+			window=10*DEFAULT_PAGE_SIZE):
+		"""
+		C'tor.
+
+		:Parameters:
+			source
+				Either an iterable of choices, or a function that is called with
+				a start position (0-based) and a count and returns a sequence of up
+				to that many choices. Fewer choices than asked for are taken as the
+				end of the choices.
+			total
+				The number of choices, if known.
+			block_size
+				The minimum number of choices fetched at once from a function.
+			window
+				The maximum number of choices kept.
+
+		An iterable can only be read forward, so choices that have passed out
+		of the window can no longer be shown or selected.
+		"""
+		## Preconditions:
+		assert block_size <= window, "window must hold at least one block"
+		## Main:
+		if callable (source):
+			self._fetch_fn = source
+			self._iter = None
+		else:
+			self._fetch_fn = None
+			self._iter = iter (source)
+		self._total = total
+		self._next = 0
+		self.block_size = block_size
+		self.window = window
+		self._held = OrderedDict()
+
+	def total (self):
+		"""
+		Return the number of choices, or None if this isn't known yet.
+		"""
+		return self._total
+
+	def label (self, i):
+		return self._get (i)[0]
+
+	def rows (self, start, stop):
+		"""
+		Return the index and label of a range of choices, in order.
+
+		Choices past the end or that can no longer be fetched are omitted.
+		"""
+		self._fetch (start, stop)
+		return [(i, self._held[i][0]) for i in xrange (start, stop)
+			if i in self._held]
+
+	def convert (self, text):
+		"""
+		Return the value of the choice selected by some text.
+
+		This is suitable for use as a converter and raises a ValueError if the
+		text does not select a choice.
+		"""
+		text = text.strip()
+		if text.isdigit() and (0 < int (text)):
+			i = int (text) - 1
+			self._fetch (i, i + 1)
+			if i in self._held:
+				return self._held[i][1]
+		else:
+			lowered = text.lower()
+			for label, value in self._held.itervalues():
+				if lowered in (label.lower(), ('%s' % value).lower()):
+					return value
+		raise ValueError ("'%s' is not one of the choices" % text)
+
+	def search (self, text, limit=None):
+		return []
+
+	def _get (self, i):
+		self._fetch (i, i + 1)
+		return self._held[i]
+
+	def _fetch (self, start, stop):
+		if (self._total is not None):
+			stop = min (stop, self._total)
+		if (stop <= start) or all ([i in self._held for i in xrange (start, stop)]):
+			return
+		if self._fetch_fn is not None:
+			stop = max (stop, start + self.block_size)
+			fetched = list (self._fetch_fn (start, stop - start))
+			if len (fetched) < (stop - start):
+				self._total = start + len (fetched)
+			for i, c in enumerate (fetched):
+				self._hold (start + i, c)
+		else:
+			# read forward to the end of the range, only keeping the window
+			while self._next < stop:
+				try:
+					c = next (self._iter)
+				except StopIteration:
+					self._total = self._next
+					break
+				self._hold (self._next, c)
+				self._next += 1
+
+	def _hold (self, i, choice):
+		from konval.impl import make_list
+		c = make_list (choice)
+		self._held.pop (i, None)
+		self._held[i] = ('%s' % c[0], c[-1])
+		while self.window < len (self._held):
+			self._held.popitem (last=False)
+
+
+
+### END #######################################################################
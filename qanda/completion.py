@@ -0,0 +1,202 @@
+"""
+Completion of answers with the tab key, and per-question history.
+
+When questions are asked on the terminal and readline is available, the tab
+key completes answers from the candidates of the question: the letters of a
+short choice, the labels of a long choice given as a `ChoiceIndex`, or the
+`completions` given for a string question::
+
+	host = prompt.string ("Which host", completions=all_hosts, qid='host')
+
+Candidates may be a sequence (which is sorted once, so completing from many
+thousands is quick), a function returning the candidates for a prefix, or any
+object with a `complete` method that does so.
+
+Questions with an id also keep their own history of answers, so the up arrow
+brings back earlier answers to that question rather than to any question.
+"""
+
+__docformat__ = "restructuredtext en"
+
+
+### IMPORTS
+
+import sys
+from bisect import bisect_left
+
+import defs
+
+__all__ = [
+	'SortedCompleter',
+	'make_completer',
+]
+
+
+### CONSTANTS & DEFINES
+
+# the most answers remembered for each question
+HISTORY_SIZE = 200
+
+
+### IMPLEMENTATION ###
+
+class SortedCompleter (object):
+	"""
+	Completes from a fixed set of candidates, held in sorted order.
+
+	For example::
+
+		>>> c = SortedCompleter (['web2', 'db1', 'web1', 'mail'])
+		>>> c.complete ('we')
+		['web1', 'web2']
+		>>> c.complete ('x')
+		[]
+
+	"""
+
+	def __init__ (self, candidates):
+		self.candidates = sorted (set (candidates))
+
+	def complete (self, prefix, limit=None):
+		"""
+		Return the candidates starting with a prefix, in order.
+		"""
+		cands = self.candidates
+		start = bisect_left (cands, prefix)
+		after = prefix and _after_prefix (prefix)
+		if after:
+			stop = bisect_left (cands, after, start)
+		else:
+			stop = start
+			while (stop < len (cands)) and cands[stop].startswith (prefix):
+				stop += 1
+		if (limit is not None):
+			stop = min (stop, start + limit)
+		return cands[start:stop]
+
+
+class _FunctionCompleter (object):
+	def __init__ (self, fn):
+		self.fn = fn
+
+	def complete (self, prefix):
+		return list (self.fn (prefix))
+
+
+def make_completer (candidates):
+	"""
+	Return a completer for some candidates, as described for the module.
+	"""
+	if (candidates is None) or hasattr (candidates, 'complete'):
+		return candidates
+	if callable (candidates):
+		return _FunctionCompleter (candidates)
+	return SortedCompleter (candidates)
+
+
+def _after_prefix (prefix):
+	"""
+	Return the first string after all those starting with a prefix.
+
+	If the prefix ends in the greatest character, there is no such string and
+	None is returned.
+	"""
+	last = ord (prefix[-1])
+	if isinstance (prefix, unicode):
+		if last < sys.maxunicode:
+			return prefix[:-1] + unichr (last + 1)
+	elif last < 255:
+		return prefix[:-1] + chr (last + 1)
+	return None
+
+
+def get_readline ():
+	"""
+	Return the readline module, or None if it is not available.
+
+	Readline is imported on the first call, and set to complete with tab.
+	"""
+	return defs.import_optional ('readline', _bind_tab)
+
+
+def _bind_tab (readline):
+	"""
+	Set readline to complete with tab.
+	"""
+	if 'libedit' in (readline.__doc__ or ''):
+		readline.parse_and_bind ('bind ^I rl_complete')
+	else:
+		readline.parse_and_bind ('tab: complete')
+
+
+def read_line (prompt, completer=None, history=None):
+	"""
+	Read a line from the terminal with completion and history.
+
+	:Parameters:
+		prompt
+			The prompt shown.
+		completer
+			If given, the completer used for the tab key.
+		history
+			If given, a list of earlier answers, used as the history in place of
+			that of the terminal. The answer is added to it.
+
+	"""
+	## Preconditions:
+	rl = get_readline()
+	if rl is None:
+		return raw_input (prompt)
+	## Main:
+	old_completer = rl.get_completer()
+	old_delims = rl.get_completer_delims()
+	if completer is not None:
+		rl.set_completer (_readline_completer (completer))
+		# complete the whole answer, not just the last word of it
+		rl.set_completer_delims ('')
+	if history is not None:
+		saved = [rl.get_history_item (i)
+			for i in xrange (1, rl.get_current_history_length() + 1)]
+		_set_history (rl, history)
+	try:
+		answer = raw_input (prompt)
+	finally:
+		if completer is not None:
+			rl.set_completer (old_completer)
+			rl.set_completer_delims (old_delims)
+		if history is not None:
+			_set_history (rl, saved)
+	## Postconditions & return:
+	if (history is not None) and answer.strip():
+		if answer in history:
+			history.remove (answer)
+		history.append (answer)
+		del history[:-HISTORY_SIZE]
+	return answer
+
+
+def _set_history (rl, lines):
+	rl.clear_history()
+	for line in lines:
+		rl.add_history (line)
+
+
+def _readline_completer (completer):
+	"""
+	Return a readline completion function for a completer.
+
+	Readline asks for each match in turn, by number, so the matches are found
+	on the first request and kept for the rest.
+	"""
+	matches = []
+	def complete (text, state):
+		if state == 0:
+			matches[:] = completer.complete (text)
+		if state < len (matches):
+			return matches[state]
+		return None
+	return complete
+
+
+
+### END #######################################################################
@@ -0,0 +1,341 @@
+"""
+Compiled chains of converters, with optional caching of pure converters.
+
+The converters of a question are called in turn on each answer, the result of
+each being passed to the next. A `ConverterChain` does this with the calls
+bound once, rather than looked up on every answer. A converter that is marked
+as `pure` - its result depends only on its input and it has no side effects -
+can have its results cached, so that an answer seen before (e.g. 'y', a menu
+number or a common host name) skips conversion entirely::
+
+	from qanda import prompt, pure
+	q = prompt.compile ('string', "Which host",
+		converters=[pure (canonical_host)])
+
+Caching is opt-in, by giving a session a `cache_size`. Only the leading run of
+pure converters in a chain is cached; any converters after the first impure
+one are always called.
+
+A slow converter (e.g. one checking a pasted key or schema) can be marked with
+`offload`, so that a session runs the chain in a pool while showing that it is
+busy, rather than freezing the prompt::
+
+	text = prompt.text ("Paste the key", converters=[offload (check_key)])
+
+"""
+
+__docformat__ = "restructuredtext en"
+
+
+### IMPORTS
+
+import threading
+from collections import OrderedDict
+
+import defs
+
+__all__ = [
+	'pure',
+	'is_pure',
+	'offload',
+	'is_offloaded',
+	'ConverterChain',
+	'ChoiceLookup',
+	'choice_lookup',
+	'yesno_lookup',
+]
+
+
+### CONSTANTS & DEFINES
+
+# lookups are shared by all questions with the same choices
+_choice_lookups = {}
+_yesno_lookup = None
+
+
+### IMPLEMENTATION ###
+
+class Pure (object):
+	"""
+	A converter marked as pure.
+
+	This is only a marker: when compiled into a chain, the wrapped converter is
+	called directly.
+	"""
+	def __init__ (self, conv):
+		self.conv = conv
+
+	def __call__ (self, value):
+		return self.conv (value)
+
+	def __repr__ (self):
+		return "pure(%r)" % (self.conv,)
+
+
+def pure (conv):
+	"""
+	Mark a converter as pure, so its results may be cached.
+	"""
+	if isinstance (conv, Pure):
+		return conv
+	return Pure (conv)
+
+
+def is_pure (conv):
+	"""
+	Is this converter marked as pure?
+
+	Converters may also mark themselves as pure with a true `pure` attribute.
+	"""
+	return isinstance (conv, Pure) or bool (getattr (conv, 'pure', False))
+
+
+class Offloaded (object):
+	"""
+	A converter marked as slow, to be run away from the prompt.
+
+	As with `Pure`, this is only a marker and is called directly when compiled
+	into a chain.
+	"""
+	def __init__ (self, conv):
+		self.conv = conv
+
+	def __call__ (self, value):
+		return self.conv (value)
+
+	@property
+	def pure (self):
+		return is_pure (self.conv)
+
+	def __repr__ (self):
+		return "offload(%r)" % (self.conv,)
+
+
+def offload (conv):
+	"""
+	Mark a converter as slow, so sessions run it in a pool.
+
+	The converter (and so the rest of its chain) must be picklable if the
+	session uses a process pool.
+	"""
+	if isinstance (conv, Offloaded):
+		return conv
+	return Offloaded (conv)
+
+
+def is_offloaded (conv):
+	"""
+	Is this converter marked to be run in a pool?
+	"""
+	while isinstance (conv, Pure):
+		conv = conv.conv
+	return isinstance (conv, Offloaded)
+
+
+def _unwrap (conv):
+	"""
+	Return the function underlying any markers on a converter.
+	"""
+	while isinstance (conv, (Pure, Offloaded)):
+		conv = conv.conv
+	return conv
+
+
+class ConverterFailure (Exception):
+	"""
+	A converter in a chain raised an error.
+
+	This records the error and the value the failing converter was given.
+	"""
+	def __init__ (self, error, value):
+		Exception.__init__ (self, error, value)
+		self.error = error
+		self.value = value
+
+
+class ConverterChain (object):
+	"""
+	A sequence of converters, compiled to be called as one.
+
+	Calling the chain with a value passes it through each converter in turn and
+	returns the result. If a converter raises a StandardError, a
+	`ConverterFailure` is raised, recording the error and the value that
+	caused it. If any converter is marked with `offload`, `offloaded` is true.
+	A chain may be called from several threads at once.
+	"""
+
+	def __init__ (self, converters, cache_size=0, kind=None):
+		"""
+		C'tor.
+
+		:Parameters:
+			converters
+				The converters, in the order they are called.
+			cache_size
+				The number of raw values for which the results of the leading
+				pure converters are kept. If 0, nothing is cached.
+			kind
+				If the chain is exactly that of a built-in question type, a key
+				for the type and its settings, e.g. ('integer', 1, 10). This
+				allows the chain to be replaced by a faster equivalent, as in
+				`qanda.bulk`.
+		"""
+		self.converters = tuple (converters)
+		self.kind = kind
+		self.offloaded = bool ([c for c in self.converters if is_offloaded (c)])
+		calls = [_unwrap (c) for c in self.converters]
+		n_pure = 0
+		if cache_size:
+			for c in self.converters:
+				if not is_pure (c):
+					break
+				n_pure += 1
+		self._pure_calls = tuple (calls[:n_pure])
+		self._calls = tuple (calls[n_pure:])
+		self.cache_size = n_pure and cache_size
+		self._cache = OrderedDict()
+		# converters are called outside the lock, only the cache is guarded
+		self._lock = threading.Lock()
+
+	def __len__ (self):
+		return len (self.converters)
+
+	def __getstate__ (self):
+		# cached results needn't go to another process, and locks can't
+		state = dict (self.__dict__)
+		del state['_cache'], state['_lock']
+		return state
+
+	def __setstate__ (self, state):
+		self.__dict__.update (state)
+		self._cache = OrderedDict()
+		self._lock = threading.Lock()
+
+	def __call__ (self, value):
+		if self._pure_calls:
+			value = self._cached (value)
+		try:
+			for conv in self._calls:
+				value = conv (value)
+		except StandardError, err:
+			raise ConverterFailure (err, value)
+		return value
+
+	def _cached (self, value):
+		"""
+		Return the result of the pure converters, from the cache if possible.
+		"""
+		cache = self._cache
+		try:
+			with self._lock:
+				ok, result = cache.pop (value)
+				# most recently used go to the end
+				cache[value] = (ok, result)
+		except KeyError:
+			raw = value
+			try:
+				for conv in self._pure_calls:
+					value = conv (value)
+				ok, result = True, value
+			except StandardError, err:
+				ok, result = False, ConverterFailure (err, value)
+			with self._lock:
+				cache[raw] = (ok, result)
+				if self.cache_size < len (cache):
+					cache.popitem (last=False)
+		except TypeError:
+			# unhashable values can't be cached
+			for conv in self._pure_calls:
+				try:
+					value = conv (value)
+				except StandardError, err:
+					raise ConverterFailure (err, value)
+			return value
+		if ok:
+			return result
+		raise result
+
+
+class ChoiceLookup (object):
+	"""
+	Converts an answer by looking it up in a table of the allowed answers.
+	"""
+	pure = True
+
+	def __init__ (self, table, fold_case=False):
+		"""
+		C'tor.
+
+		:Parameters:
+			table
+				A dictionary of the allowed answers and the values they give.
+			fold_case
+				If true, answers not in the table are looked up again in lower
+				case. The table should then have lower case keys.
+		"""
+		self.table = table
+		self.fold_case = fold_case
+
+	def __call__ (self, value):
+		try:
+			return self.table[value]
+		except KeyError:
+			if self.fold_case and (value.lower() in self.table):
+				return self.table[value.lower()]
+			raise ValueError ("'%s' is not one of the choices" % value)
+
+	def complete (self, prefix):
+		"""
+		Return the allowed answers starting with a prefix, for completion.
+		"""
+		return sorted ([k for k in self.table if k.startswith (prefix) and
+			not (self.fold_case and (k != k.lower()))])
+
+
+def choice_lookup (choice_str):
+	"""
+	Return the lookup for a choice of single letters.
+
+	For example::
+
+		>>> choice_lookup ('abc') ('b')
+		'b'
+		>>> choice_lookup ('abc') is choice_lookup ('abc')
+		True
+
+	"""
+	lookup = _choice_lookups.get (choice_str)
+	if lookup is None:
+		lookup = ChoiceLookup (dict ([(c, c) for c in choice_str]))
+		_choice_lookups[choice_str] = lookup
+	return lookup
+
+
+def yesno_lookup ():
+	"""
+	Return the lookup for yes or no answers, including their synonyms.
+
+	The answers are those in `defs.YESNO_SYNONYMS`, in any case. For example::
+
+		>>> yesno_lookup() ('Yes')
+		True
+		>>> yesno_lookup() ('off')
+		False
+
+	"""
+	global _yesno_lookup
+	if _yesno_lookup is None:
+		synonyms = dict (defs.YESNO_SYNONYMS)
+		synonyms[defs.ANSWER_YES] = defs.ANSWER_YES
+		synonyms[defs.ANSWER_NO] = defs.ANSWER_NO
+		table = {}
+		for k, v in synonyms.items():
+			# the common capitalisations need no second lookup
+			for ans in (k, k.upper(), k.capitalize()):
+				table[ans] = (v == defs.ANSWER_YES)
+		_yesno_lookup = ChoiceLookup (table, fold_case=True)
+	return _yesno_lookup
+
+
+
+### END #######################################################################
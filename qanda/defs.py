@@ -4,11 +4,17 @@ Various module-wide constants.
 
 ### IMPORTS
 
+import os
 import re
+import weakref
 
 __all__ = [
 	'SPACE_RE',
 	'YESNO_SYNONYMS',
+	'import_optional',
+	'get_colorama',
+	'get_default_styles',
+	'stream_supports_styles',
 ]
 
 
@@ -28,22 +34,106 @@ YESNO_SYNONYMS = {
 	'off': 'n',
 	't': 'y',
 	'f': 'n',
+	'1': 'y',
+	'0': 'n',
+	'+': 'y',
+	'-': 'n',
 }
 
-try:
-	import colorama as clr
-	COLORAMA_AVAILABLE = True
-	DEFAULT_STYLES = {
-		'HELP':       clr.Style.DIM,
-		'CHOICES':    clr.Fore.BLUE,
-		'QUESTION':   clr.Fore.CYAN,
-		'HINTS':      clr.Fore.BLUE,
-		'ANSWER':     clr.Fore.WHITE,
-		'ERROR':      clr.Fore.RED,
-	}
-except:
-	COLORAMA_AVAILABLE = False
-	DEFAULT_STYLES = {}
+# Names of the colorama styles for the elements of a question. Colorama is
+# only loaded when styles are first needed, see get_default_styles.
+STYLE_NAMES = {
+	'HELP':       ('Style', 'DIM'),
+	'CHOICES':    ('Fore', 'BLUE'),
+	'QUESTION':   ('Fore', 'CYAN'),
+	'HINTS':      ('Fore', 'BLUE'),
+	'ANSWER':     ('Fore', 'WHITE'),
+	'ERROR':      ('Fore', 'RED'),
+}
+
+# optional modules as imported, or None where not available
+_optional_modules = {}
+
+_default_styles = None
+
+# whether each output stream can show styles, as found
+_stream_styles = weakref.WeakKeyDictionary()
+
+
+### IMPLEMENTATION ###
+
+def import_optional (name, setup=None):
+	"""
+	Return a module that need not be installed, or None if it is not.
+
+	:Parameters:
+		name
+			The name of the module.
+		setup
+			If given, a function that is called with the module once imported.
+
+	The module is only imported on the first call, and the result kept.
+	"""
+	try:
+		return _optional_modules[name]
+	except KeyError:
+		pass
+	try:
+		module = __import__ (name)
+		if setup is not None:
+			setup (module)
+	except ImportError:
+		module = None
+	_optional_modules[name] = module
+	return module
+
+
+def get_colorama ():
+	"""
+	Return the colorama module, or None if it is not available.
+
+	Colorama is imported on the first call.
+	"""
+	return import_optional ('colorama')
+
+
+def get_default_styles ():
+	"""
+	Return the default styles for question elements.
+
+	This is empty if colorama is not available.
+	"""
+	global _default_styles
+	if _default_styles is None:
+		clr = get_colorama()
+		if clr is None:
+			_default_styles = {}
+		else:
+			_default_styles = dict ([(k, getattr (getattr (clr, grp), name))
+				for k, (grp, name) in STYLE_NAMES.items()])
+	return _default_styles
+
+
+def stream_supports_styles (stream):
+	"""
+	Can styles be shown on this output stream?
+
+	Only terminals (other than dumb ones) can show styles. The answer for each
+	stream is cached.
+	"""
+	try:
+		return _stream_styles[stream]
+	except (KeyError, TypeError):
+		pass
+	isatty = getattr (stream, 'isatty', None)
+	supported = bool (isatty and isatty()) and \
+		(os.environ.get ('TERM') != 'dumb')
+	try:
+		_stream_styles[stream] = supported
+	except TypeError:
+		# streams that can't be weakly referenced are checked every time
+		pass
+	return supported
 
 
 
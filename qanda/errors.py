@@ -0,0 +1,114 @@
+"""
+Exceptions raised by qanda.
+"""
+
+__docformat__ = "restructuredtext en"
+
+
+### IMPORTS
+
+__all__ = [
+	'QandaError',
+	'ConversionError',
+	'AnswerError',
+	'NoAnswerError',
+	'FormErrors',
+	'InputTimeout',
+	'TooManyAttempts',
+]
+
+
+### CONSTANTS & DEFINES
+
+### IMPLEMENTATION ###
+
+class QandaError (Exception):
+	"""
+	Base class for all qanda errors.
+	"""
+	pass
+
+
+class ConversionError (QandaError, ValueError):
+	"""
+	An answer could not be converted or failed validation.
+
+	The message is the user-facing explanation of the problem, formatted by the
+	question's error message.
+	"""
+	def __init__ (self, message, bad_val=None):
+		QandaError.__init__ (self, message)
+		self.bad_val = bad_val
+
+
+class AnswerError (QandaError):
+	"""
+	A supplied (non-interactive) answer was rejected.
+
+	Interactively a bad answer leads to the question being asked again, but
+	when answers come from a file or other source there is no one to ask, so
+	this is raised instead.
+	"""
+	def __init__ (self, question, answer, reason):
+		QandaError.__init__ (self, "answer %r to '%s' rejected: %s" % (
+			answer, question, reason))
+		self.question = question
+		self.answer = answer
+		self.reason = reason
+
+
+class NoAnswerError (AnswerError):
+	"""
+	An answer source had no answer for a question that has no default.
+	"""
+	def __init__ (self, question):
+		QandaError.__init__ (self, "no answer supplied for '%s'" % question)
+		self.question = question
+		self.answer = None
+		self.reason = "no answer supplied"
+
+
+class FormErrors (QandaError):
+	"""
+	One or more answers to a form were missing or invalid.
+
+	The problems are in `errors`, a dictionary of messages keyed by the name of
+	the question.
+	"""
+	def __init__ (self, errors):
+		QandaError.__init__ (self, "invalid answers to form: %s" % ', '.join (
+			["%s (%s)" % (k, errors[k]) for k in sorted (errors)]))
+		self.errors = errors
+
+
+class InputTimeout (QandaError):
+	"""
+	No answer was given to a question, which has no default, in time.
+	"""
+	def __init__ (self, question, timeout):
+		QandaError.__init__ (self, "no answer to '%s' within %s seconds" % (
+			question, timeout))
+		self.question = question
+		self.timeout = timeout
+
+
+
+class TooManyAttempts (AnswerError):
+	"""
+	A question was answered wrongly too many times.
+
+	Every attempt is in `attempts`, a list of the raw answer and error message
+	of each. The last of these is also given as the `answer` and `reason`.
+	"""
+	def __init__ (self, question, attempts):
+		answer, reason = attempts[-1]
+		QandaError.__init__ (self, "no valid answer to '%s' after %s attempts, "
+			"last %r: %s" % (question, len (attempts), answer, reason))
+		self.question = question
+		self.answer = answer
+		self.reason = reason
+		self.attempts = attempts
+
+
+
+### END #######################################################################
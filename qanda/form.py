@@ -0,0 +1,186 @@
+"""
+Forms: ordered sets of questions that are asked or validated together.
+
+A form is declared once, with questions that may depend on the answers to
+earlier ones::
+
+	form = Form()
+	form.add ('name', 'string', "What is your name")
+	form.add ('age', 'integer', "How old are you", min=1, max=120)
+	form.add ('has_car', 'yesno', "Do you have a car")
+	form.add ('car', 'string', "What make of car", when='has_car')
+
+It can then be asked interactively, one question after another::
+
+	answers = form.ask (prompt)
+
+or a whole set of answers can be validated at once. All the answers are
+converted together (optionally in parallel) and every error is reported in
+one go, rather than one question at a time::
+
+	try:
+		answers = form.validate ({'name': 'Bob', 'age': '200', 'has_car': 'y'})
+	except FormErrors, err:
+		print err.errors
+	# {'age': '200 is higher than 120', 'car': 'no answer supplied'}
+
+"""
+
+__docformat__ = "restructuredtext en"
+
+
+### IMPORTS
+
+from session import Session
+from errors import ConversionError, FormErrors
+
+__all__ = [
+	'Form',
+]
+
+
+### CONSTANTS & DEFINES
+
+### IMPLEMENTATION ###
+
+class Form (object):
+	"""
+	An ordered set of questions, possibly dependent on each other.
+	"""
+
+	def __init__ (self, session=None):
+		"""
+		C'tor.
+
+		:Parameters:
+			session
+				The session used to build the questions. If not given, a session
+				with default settings is used.
+		"""
+		self.session = session or Session()
+		self.fields = []
+		self._questions = {}
+
+	def add (self, name, kind, question, when=None, **kwargs):
+		"""
+		Add a question to the form.
+
+		:Parameters:
+			name
+				The key the answer is returned under. This is also used as the
+				question id.
+			kind
+				The type of question, as per `Session.compile`.
+			question
+				The text of the question.
+			when
+				If given, the question is only asked when this is true. It may be
+				the name of an earlier question (whose answer must be true) or a
+				function that is passed a dictionary of the answers so far.
+
+		Other keyword arguments are passed to the question, as per
+		`Session.compile`.
+		"""
+		## Preconditions:
+		assert name not in self._questions, "question '%s' already in form" % name
+		## Main:
+		kwargs.setdefault ('qid', name)
+		q = self.session.compile (kind, question, **kwargs)
+		if isinstance (when, basestring):
+			when = _answer_is_true (when)
+		self.fields.append ((name, q, when))
+		self._questions[name] = q
+
+	def ask (self, session=None):
+		"""
+		Ask each applicable question in turn, returning the answers.
+
+		If another session is given, questions are asked through that, but
+		keep the formatting of the form's session.
+		"""
+		answers = {}
+		for name, q, when in self.fields:
+			if (when is None) or when (answers):
+				answers[name] = q.ask (session)
+		return answers
+
+	def validate (self, raw_answers, pool=None):
+		"""
+		Check and convert a set of raw answers, returning the converted values.
+
+		:Parameters:
+			raw_answers
+				A dictionary of raw (string) answers, keyed by question name.
+			pool
+				Optionally, a pool to run conversions in, which need only have a
+				`map` method, e.g. a `multiprocessing.pool.ThreadPool`. Process
+				pools require converters that can be pickled.
+
+		Every supplied answer is converted, and then the conditions on questions
+		are checked against the converted answers. If any question that applies
+		has a missing or invalid answer, a `FormErrors` is raised listing all of
+		them. Otherwise a dictionary of the answers to the questions that apply
+		is returned.
+		"""
+		## Main:
+		jobs = [(q, raw_answers.get (name)) for name, q, when in self.fields]
+		if pool is None:
+			results = map (_convert, jobs)
+		else:
+			results = pool.map (_convert, jobs)
+		converted = dict (zip ([f[0] for f in self.fields], results))
+		answers = {}
+		errors = {}
+		for name, q, when in self.fields:
+			if (when is not None):
+				# a condition on a failed (and so missing) answer can't be judged,
+				# but that answer will be reported anyway
+				try:
+					applies = when (answers)
+				except StandardError:
+					applies = False
+				if not applies:
+					continue
+			ok, result = converted[name]
+			if ok:
+				answers[name] = result
+			else:
+				errors[name] = result
+		## Postconditions & return:
+		if errors:
+			raise FormErrors (errors)
+		return answers
+
+
+def _answer_is_true (name):
+	"""
+	Return a condition that checks if a named answer is true.
+	"""
+	def check (answers):
+		return bool (answers[name])
+	return check
+
+
+# a plain session, used for converting answers outside of a session
+_converting_session = Session (use_styles=False)
+
+
+def _convert (job):
+	"""
+	Convert a raw answer to a question, returning success and result.
+
+	This is a top-level function so it can be used by process pools.
+	"""
+	q, raw_answer = job
+	if raw_answer is None:
+		if (q.default is None) and (q.default_value is None):
+			return False, "no answer supplied"
+		raw_answer = ''
+	try:
+		return True, _converting_session._process_answer (q, '%s' % raw_answer)
+	except ConversionError, err:
+		return False, str (err)
+
+
+
+### END #######################################################################
@@ -0,0 +1,177 @@
+"""
+A compact history of the questions asked in a session and their answers.
+
+For auditing long-running sessions, a session can keep every answer it
+accepts, with the question, when it was asked and answered, the number of
+attempts and the raw and converted answers::
+
+	from qanda import Session
+	s = Session (history=True)
+	...
+	for rec in s.history:
+		print rec.qid, rec.raw, rec.value
+	s.history.export ('answers.json')
+
+The history is held as columns (arrays of numbers where possible) rather than
+an object per answer, and each question is stored once however often it is
+asked, so millions of answers take little more than the answers themselves.
+It is exported the same way, as a JSON object of columns.
+"""
+
+__docformat__ = "restructuredtext en"
+
+
+### IMPORTS
+
+import json
+import time
+import threading
+from array import array
+
+from observers import Observer, clock, _asking_key
+
+__all__ = [
+	'AnswerHistory',
+	'AnswerRecord',
+]
+
+
+### CONSTANTS & DEFINES
+
+# the columns of a history, in order
+COLUMNS = ('qid', 'question', 'asked', 'answered', 'attempts', 'raw', 'value')
+
+
+### IMPLEMENTATION ###
+
+class AnswerRecord (object):
+	"""
+	A question that was asked and the answer accepted.
+
+	Times are as per `time.time`. `raw` is the last raw answer given.
+	"""
+	__slots__ = COLUMNS
+
+	def __init__ (self, qid, question, asked, answered, attempts, raw, value):
+		self.qid = qid
+		self.question = question
+		self.asked = asked
+		self.answered = answered
+		self.attempts = attempts
+		self.raw = raw
+		self.value = value
+
+	def __repr__ (self):
+		return "<%s %r %r>" % (self.__class__.__name__,
+			self.qid or self.question, self.value)
+
+
+class AnswerHistory (Observer):
+	"""
+	An observer that records each answer accepted by a session.
+
+	Records can be had by index or iteration, as `AnswerRecord`s made when
+	asked for. Answers from several threads are recorded whole, one at a time.
+	"""
+
+	def __init__ (self):
+		# questions are kept once each, as (qid, text), and referred to by index
+		self.questions = []
+		self._question_index = {}
+		self._question = array ('l')
+		self._asked = array ('d')
+		self._answered = array ('d')
+		self._attempts = array ('l')
+		self._raw = []
+		self._value = []
+		self._asking = {}
+		self._lock = threading.Lock()
+		# observer times are from the clock, but wall times are wanted here
+		self._to_wall = time.time() - clock()
+
+	def question_asked (self, q, t):
+		self._asking[_asking_key (q)] = [t, 0, None]
+
+	def input_received (self, q, t, raw_answer):
+		state = self._asking.get (_asking_key (q))
+		if state is not None:
+			state[1] += 1
+			state[2] = raw_answer
+
+	def answer_accepted (self, q, t, value):
+		state = self._asking.pop (_asking_key (q), None)
+		if state is None:
+			return
+		key = (q.qid, q.question)
+		# the columns must be added to together
+		with self._lock:
+			index = self._question_index.get (key)
+			if index is None:
+				index = len (self.questions)
+				self.questions.append (key)
+				self._question_index[key] = index
+			self._question.append (index)
+			self._asked.append (state[0] + self._to_wall)
+			self._answered.append (t + self._to_wall)
+			self._attempts.append (state[1])
+			self._raw.append (state[2])
+			self._value.append (value)
+
+	def question_failed (self, q, t, err):
+		self._asking.pop (_asking_key (q), None)
+
+	def __len__ (self):
+		return len (self._question)
+
+	def __getitem__ (self, i):
+		qid, question = self.questions[self._question[i]]
+		return AnswerRecord (qid, question, self._asked[i], self._answered[i],
+			self._attempts[i], self._raw[i], self._value[i])
+
+	def __iter__ (self):
+		for i in xrange (len (self)):
+			yield self[i]
+
+	def columns (self):
+		"""
+		Return the history as a dictionary of columns.
+
+		Each column is a list, with one entry per answer. The 'qid' and
+		'question' columns are given as indexes into the list of (qid, text)
+		pairs under 'questions', rather than repeating the text.
+		"""
+		return {
+			'questions': [list (k) for k in self.questions],
+			'question': self._question.tolist(),
+			'asked': self._asked.tolist(),
+			'answered': self._answered.tolist(),
+			'attempts': self._attempts.tolist(),
+			'raw': list (self._raw),
+			'value': list (self._value),
+		}
+
+	def export (self, out):
+		"""
+		Write the history, as a JSON object of `columns`.
+
+		:Parameters:
+			out
+				The path of the file written, or an open file-like object.
+
+		Values that JSON can't hold are written as their repr.
+		"""
+		if isinstance (out, basestring):
+			with open (out, 'w') as outfile:
+				self.export (outfile)
+			return
+		json.dump (self.columns(), out, separators=(',', ':'), default=repr)
+
+	def clear (self):
+		"""
+		Forget all recorded answers.
+		"""
+		self.__init__()
+
+
+
+### END #######################################################################
@@ -0,0 +1,221 @@
+"""
+Observing the asking and answering of questions.
+
+Observers added to a session are told of each step in asking a question,
+with a timestamp, allowing the time users take to answer, the number of
+attempts they need and the cost of converters to be recorded. For example::
+
+	from qanda import Session, MetricsObserver
+	metrics = MetricsObserver()
+	s = Session()
+	s.add_observer (metrics)
+	...
+	print metrics.report()
+
+A session with no observers does no extra work. Observers may be told of
+questions asked in several threads at once, if a session is shared.
+"""
+
+__docformat__ = "restructuredtext en"
+
+
+### IMPORTS
+
+import time
+import threading
+from thread import get_ident
+
+__all__ = [
+	'Observer',
+	'MetricsObserver',
+]
+
+
+### CONSTANTS & DEFINES
+
+# the timer for events, monotonic where the Python version allows
+clock = getattr (time, 'monotonic', time.time)
+
+
+### IMPLEMENTATION ###
+
+class Observer (object):
+	"""
+	Base class for observers, which ignores all events.
+
+	Subclasses override the methods for the events of interest. Each is passed
+	the `Question` being asked and the time of the event from `clock`.
+	"""
+
+	def question_asked (self, q, t):
+		"""
+		A question is to be asked (or answered from an answer source).
+		"""
+		pass
+
+	def prompt_rendered (self, q, t, text):
+		"""
+		The prompt (with any help, menu or error) has been shown to the user.
+		"""
+		pass
+
+	def input_received (self, q, t, raw_answer):
+		"""
+		A raw answer has been received and is about to be processed.
+		"""
+		pass
+
+	def converter_start (self, q, t, conv, value):
+		"""
+		The converters are about to be called with a value.
+
+		`conv` is the question's `ConverterChain`, which calls them all.
+		"""
+		pass
+
+	def converter_end (self, q, t, conv, value):
+		"""
+		The converters have returned a value.
+		"""
+		pass
+
+	def validation_failed (self, q, t, raw_answer, err):
+		"""
+		An answer was rejected, with the given `ConversionError`.
+		"""
+		pass
+
+	def answer_accepted (self, q, t, value):
+		"""
+		An answer was accepted and the question will return this value.
+		"""
+		pass
+
+	def question_failed (self, q, t, err):
+		"""
+		The question ended with an error rather than an answer, e.g.
+		`TooManyAttempts`, `InputTimeout` or `AnswerError`.
+		"""
+		pass
+
+
+class MetricsObserver (Observer):
+	"""
+	Collects timings and attempt counts for each question.
+
+	Questions are identified by their id if they have one, or otherwise by
+	their text. Time to answer is measured from when a question is asked to when
+	an answer is accepted. Questions that fail (e.g. with too many wrong
+	answers) count towards retries, but not times.
+	"""
+
+	def __init__ (self):
+		self.stats = {}
+		self._asking = {}
+		self._lock = threading.Lock()
+
+	def question_asked (self, q, t):
+		self._asking[_asking_key (q)] = [t, 0, 0.0, None]
+
+	def input_received (self, q, t, raw_answer):
+		state = self._asking.get (_asking_key (q))
+		if state is not None:
+			state[1] += 1
+
+	def converter_start (self, q, t, conv, value):
+		state = self._asking.get (_asking_key (q))
+		if state is not None:
+			state[3] = t
+
+	def converter_end (self, q, t, conv, value):
+		self._end_converter (q, t)
+
+	def validation_failed (self, q, t, raw_answer, err):
+		self._end_converter (q, t)
+
+	def answer_accepted (self, q, t, value):
+		self._end_question (q, t, True)
+
+	def question_failed (self, q, t, err):
+		self._end_question (q, t, False)
+
+	def _end_question (self, q, t, answered):
+		state = self._asking.pop (_asking_key (q), None)
+		if state is None:
+			return
+		start, attempts, conv_secs, conv_start = state
+		with self._lock:
+			stats = self.stats.setdefault (q.key, {
+				'times': [],
+				'attempts': [],
+				'failures': 0,
+				'converter_secs': 0.0,
+			})
+			if answered:
+				stats['times'].append (t - start)
+			else:
+				stats['failures'] += 1
+			stats['attempts'].append (attempts)
+			stats['converter_secs'] += conv_secs
+
+	def report (self):
+		"""
+		Summarise the collected metrics.
+
+		Returns a dictionary, keyed by question, of the number of answers and
+		failures, the median and 99th percentile time to answer, the total and
+		maximum number of retries and the total time spent in converters.
+		"""
+		summary = {}
+		with self._lock:
+			for key, stats in self.stats.items():
+				times = sorted (stats['times'])
+				retries = [max (a - 1, 0) for a in stats['attempts']]
+				summary[key] = {
+					'answers': len (times),
+					'failures': stats['failures'],
+					'p50_secs': percentile (times, 50),
+					'p99_secs': percentile (times, 99),
+					'retries': sum (retries),
+					'max_retries': max (retries),
+					'converter_secs': stats['converter_secs'],
+				}
+		return summary
+
+	def _end_converter (self, q, t):
+		state = self._asking.get (_asking_key (q))
+		if (state is not None) and (state[3] is not None):
+			state[2] += t - state[3]
+			state[3] = None
+
+
+def _asking_key (q):
+	"""
+	Return the key that observers keep the state of an asked question by.
+
+	A question is asked once at a time in a thread, but may be asked in
+	several threads at once.
+	"""
+	return (get_ident(), id (q))
+
+
+def percentile (sorted_vals, pc):
+	"""
+	Return the nearest-rank percentile of a sorted list of values.
+
+	For example::
+
+		>>> percentile ([1, 2, 3, 4], 50)
+		2
+		>>> percentile ([1, 2, 3, 4], 99)
+		4
+
+	"""
+	if not sorted_vals:
+		return None
+	rank = max (int (-(-len (sorted_vals) * pc // 100)), 1)
+	return sorted_vals[rank - 1]
+
+
+
+### END #######################################################################
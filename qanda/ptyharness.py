@@ -0,0 +1,249 @@
+"""
+Driving a session on a pseudo-terminal, for testing and benchmarking.
+
+Scripted input streams don't exercise what happens on a real terminal: input
+through `raw_input` and readline, styles chosen because the output is a
+terminal, and the cost of writing prompts to it. A `PtyHarness` instead runs
+questions in a child process on a pseudo-terminal and answers them from the
+other end, as fast as the child allows::
+
+	def ask (session):
+		session.integer ("How old are you", min=1, max=120)
+
+	with PtyHarness (ask) as h:
+		print h.run (['42'], asks=500)
+
+`run` reports the time from each answer being sent to the next prompt being
+shown, and the bytes read from the terminal for each question (which include
+the echo of the answer). This needs a Unix with the `pty` module.
+"""
+
+__docformat__ = "restructuredtext en"
+
+
+### IMPORTS
+
+import os
+import re
+import pty
+import time
+import errno
+import select
+import signal
+import traceback
+
+from session import Session
+from observers import percentile
+from errors import QandaError
+
+__all__ = [
+	'PtyHarness',
+	'HarnessError',
+]
+
+
+### CONSTANTS & DEFINES
+
+# the end of a prompt: a colon and a space, with any styles between
+PROMPT_END = re.compile (r':(\x1b\[[0-9;]*m)* $')
+
+# how much of the end of the output is searched for a prompt
+TAIL_SIZE = 256
+
+READ_SIZE = 65536
+
+# seconds to wait for a prompt, and for the child to exit once closed
+DEFAULT_TIMEOUT = 10.0
+EXIT_TIMEOUT = 2.0
+
+
+### IMPLEMENTATION ###
+
+class HarnessError (QandaError):
+	"""
+	The session on the pseudo-terminal failed, ended or didn't prompt in time.
+	"""
+	pass
+
+
+class PtyHarness (object):
+	"""
+	Runs a question, over and over, on a pseudo-terminal in a child process.
+	"""
+
+	def __init__ (self, ask, use_styles=True, readline=True, term='xterm',
+			**kwargs):
+		"""
+		C'tor.
+
+		:Parameters:
+			ask
+				A function that is passed a `Session` and asks a question of it.
+				This is called repeatedly in the child until input ends.
+			use_styles
+				As for `Session`. By default, styles are used as the output is
+				a terminal.
+			readline
+				If true, readline is loaded in the child, so answers are read
+				through it.
+			term
+				The terminal type the child is given.
+
+		Other arguments are passed to the `Session`. Input and output are left
+		as the terminal.
+		"""
+		self.ask = ask
+		self.use_styles = use_styles
+		self.readline = readline
+		self.term = term
+		self.session_kwargs = kwargs
+		self.pid = None
+		self.fd = None
+
+	def start (self):
+		"""
+		Start the child, which asks the question until input ends.
+		"""
+		## Preconditions:
+		assert self.pid is None, "harness already started"
+		## Main:
+		pid, fd = pty.fork()
+		if pid == 0:
+			self._run_child()
+		self.pid = pid
+		self.fd = fd
+
+	def _run_child (self):
+		# never returns, as the child must not carry on with the parent's work
+		status = 1
+		try:
+			try:
+				os.environ['TERM'] = self.term
+				if self.readline:
+					from completion import get_readline
+					get_readline()
+				session = Session (use_styles=self.use_styles,
+					**self.session_kwargs)
+				while True:
+					self.ask (session)
+			except EOFError:
+				status = 0
+			except Exception:
+				traceback.print_exc()
+		finally:
+			os._exit (status)
+
+	def read_prompt (self, timeout=DEFAULT_TIMEOUT):
+		"""
+		Read output until a prompt is shown, returning all that was read.
+		"""
+		end = time.time() + timeout
+		chunks = []
+		tail = ''
+		while True:
+			remaining = end - time.time()
+			if remaining <= 0:
+				raise HarnessError ("no prompt within %s secs, output ends %r" % (
+					timeout, ''.join (chunks)[-TAIL_SIZE:]))
+			if not select.select ([self.fd], [], [], remaining)[0]:
+				continue
+			try:
+				data = os.read (self.fd, READ_SIZE)
+			except OSError, err:
+				# reading a terminal whose other end has closed gives EIO
+				if err.errno != errno.EIO:
+					raise
+				data = ''
+			if not data:
+				raise HarnessError ("session ended, output ends %r" %
+					''.join (chunks)[-TAIL_SIZE:])
+			chunks.append (data)
+			tail = (tail + data)[-TAIL_SIZE:]
+			if PROMPT_END.search (tail):
+				return ''.join (chunks)
+
+	def answer (self, text, timeout=DEFAULT_TIMEOUT):
+		"""
+		Answer the current prompt and wait for the next.
+
+		Returns the seconds taken for the next prompt to be shown, and the
+		output read in that time.
+		"""
+		start = time.time()
+		os.write (self.fd, text + '\n')
+		output = self.read_prompt (timeout)
+		return time.time() - start, output
+
+	def run (self, answers, asks=100, timeout=DEFAULT_TIMEOUT):
+		"""
+		Answer a number of prompts, returning measurements.
+
+		:Parameters:
+			answers
+				The answers to give, one line per question, used in turn and
+				repeated as needed.
+			asks
+				The number of questions to answer.
+			timeout
+				The longest to wait for any prompt, in seconds.
+
+		Returns a dictionary of the number of asks, the median and 99th
+		percentile time (in microseconds) from an answer being sent to the
+		next prompt, and the bytes read per question. The child is started if
+		need be, and its first prompt is not counted.
+		"""
+		## Preconditions:
+		assert answers, "need answers for questions"
+		## Main:
+		if self.pid is None:
+			self.start()
+			self.read_prompt (timeout)
+		times = []
+		total_bytes = 0
+		for i in xrange (asks):
+			secs, output = self.answer (answers[i % len (answers)], timeout)
+			times.append (secs)
+			total_bytes += len (output)
+		times.sort()
+		## Postconditions & return:
+		return {
+			'asks': asks,
+			'usecs_p50': percentile (times, 50) * 1e6,
+			'usecs_p99': percentile (times, 99) * 1e6,
+			'bytes_per_ask': float (total_bytes) / asks,
+		}
+
+	def close (self):
+		"""
+		End input to the child and wait for it to exit, killing it if need be.
+		"""
+		if self.pid is None:
+			return
+		try:
+			# end of input, as typed at the start of a line
+			os.write (self.fd, '\x04')
+		except OSError:
+			pass
+		end = time.time() + EXIT_TIMEOUT
+		while True:
+			pid, status = os.waitpid (self.pid, os.WNOHANG)
+			if pid:
+				break
+			if end < time.time():
+				os.kill (self.pid, signal.SIGKILL)
+				os.waitpid (self.pid, 0)
+				break
+			time.sleep (0.01)
+		os.close (self.fd)
+		self.pid = None
+		self.fd = None
+
+	def __enter__ (self):
+		return self
+
+	def __exit__ (self, exc_type, exc_val, exc_tb):
+		self.close()
+
+
+
+### END #######################################################################
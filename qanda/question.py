@@ -0,0 +1,178 @@
+"""
+Pre-rendered questions that can be asked repeatedly.
+
+Building a question - cleaning the help text, formatting the hints and menu,
+applying styles and assembling the converters - is the same work every time
+the same question is asked. A `Question` holds the result of that work so that
+a question asked many times (e.g. in a loop over hosts) is only built once::
+
+	from qanda import prompt
+	q = prompt.compile ('integer', "How many copies", min=1, max=10)
+	for host in hosts:
+		copies[host] = q.ask()
+
+"""
+
+__docformat__ = "restructuredtext en"
+
+
+### IMPORTS
+
+from convert import ConverterChain
+
+__all__ = [
+	'Question',
+	'ChoiceQuestion',
+	'TextQuestion',
+]
+
+
+### CONSTANTS & DEFINES
+
+### IMPLEMENTATION ###
+
+class Question (object):
+	"""
+	A question that has been rendered and is ready to be asked.
+
+	These are not usually created directly, but via `Session.compile`. All the
+	text is rendered in the style of the originating session, so a question
+	should only be asked of that session.
+	"""
+	# how multiline text is read, see `TextQuestion`
+	terminator = None
+	max_size = None
+	as_lines = False
+
+	def __init__ (self, session, question, leadin='', question_str='',
+			converters=[], default=None, default_value=None, multiline=False,
+			strip_flanking_space=True, err_msg=None, qid=None, timeout=None,
+			completer=None, cache_size=0):
+		"""
+		C'tor.
+
+		:Parameters:
+			session
+				The session the question was compiled by and is asked through.
+			question
+				The unrendered text of the question.
+			leadin
+				The rendered help text and menu of choices (if any) that is shown
+				before the question, as a single string.
+			question_str
+				The rendered question line, including hints and defaults.
+			converters
+				The converters, or an already compiled `ConverterChain`.
+			completer
+				If given, an object whose `complete` method returns the candidate
+				answers starting with a prefix, for completion on the terminal.
+			cache_size
+				The size of the cache for pure converters, as per `ConverterChain`.
+
+		The remaining parameters are as for `Session._ask`.
+		"""
+		self.session = session
+		self.question = question
+		self.leadin = leadin
+		self.question_str = question_str
+		if not isinstance (converters, ConverterChain):
+			converters = ConverterChain (converters, cache_size)
+		self.convert = converters
+		self.converters = converters.converters
+		self.default = default
+		self.default_value = default_value
+		self.multiline = multiline
+		self.strip_flanking_space = strip_flanking_space
+		self.err_msg = err_msg or "%(err)s"
+		self.qid = qid
+		self.timeout = timeout
+		self.completer = completer
+
+	def ask (self, session=None):
+		"""
+		Ask the question and return the validated answer.
+
+		:Parameters:
+			session
+				The session to ask through, if not the one the question was
+				compiled by. The question keeps that session's formatting.
+		"""
+		return (session or self.session)._ask_question (self)
+
+	def __getstate__ (self):
+		# the session holds streams and so can't be pickled, but isn't needed
+		# for converting answers (e.g. in another process)
+		state = dict (self.__dict__)
+		state['session'] = None
+		return state
+
+	@property
+	def key (self):
+		"""
+		The id of the question if it has one, otherwise the question text.
+		"""
+		if self.qid is None:
+			return self.question
+		return self.qid
+
+	def __repr__ (self):
+		return "<%s %r>" % (self.__class__.__name__, self.question)
+
+
+class ChoiceQuestion (Question):
+	"""
+	A choice from an indexed list, shown a page at a time.
+
+	Rather than listing every choice, the user is shown a page of them and may
+	page through them or type part of a label to search.
+	"""
+
+	def __init__ (self, session, question, index=None, page_size=20, **kwargs):
+		"""
+		C'tor.
+
+		:Parameters:
+			index
+				The `ChoiceIndex` of choices.
+			page_size
+				The number of choices shown at once.
+
+		Other parameters are as for `Question`.
+		"""
+		Question.__init__ (self, session, question, **kwargs)
+		self.index = index
+		self.page_size = page_size
+
+	def ask (self, session=None):
+		return (session or self.session)._ask_choice_question (self)
+
+
+class TextQuestion (Question):
+	"""
+	A question answered with multiple lines of text.
+	"""
+
+	def __init__ (self, session, question, terminator=None, max_size=None,
+			as_lines=False, **kwargs):
+		"""
+		C'tor.
+
+		:Parameters:
+			terminator
+				The line that ends the text, or None for two blank lines.
+			max_size
+				The most characters the text may have, or None for no limit.
+			as_lines
+				Should converters be passed an iterator over the lines of the text,
+				rather than a string?
+
+		Other parameters are as for `Question`.
+		"""
+		Question.__init__ (self, session, question, **kwargs)
+		self.terminator = terminator
+		self.max_size = max_size
+		self.as_lines = as_lines
+
+
+
+### END #######################################################################
@@ -0,0 +1,265 @@
+"""
+Recording sessions and replaying them for regression testing.
+
+A `SessionRecorder` is an observer that appends every question asked to a
+log, with the prompt shown, each raw answer given and the final value. Such a
+log can then be replayed against the same script: the recorded answers are fed
+back in at full speed with nothing shown, and any question whose prompt or
+final value differs is reported::
+
+	from qanda import Session, SessionRecorder, replay_log
+
+	# record
+	s = Session()
+	s.add_observer (SessionRecorder ('install.log'))
+	run_installer (s)
+
+	# later, after changes
+	for diff in replay_log ('install.log', run_installer):
+		print diff
+
+The log is one JSON object per line. Each session starts with a header line
+and each answered question is a line with the keys 'k' (question id or text),
+'q' (question text), 'p' (prompt shown), 'r' (raw answers) and 'v' (value).
+Prompts are logged and compared without styles, so a session recorded on a
+terminal replays cleanly with nothing shown.
+"""
+
+__docformat__ = "restructuredtext en"
+
+
+### IMPORTS
+
+import re
+import json
+import time
+import threading
+from collections import deque
+
+from session import Session
+from observers import Observer, _asking_key
+from errors import QandaError
+
+__all__ = [
+	'SessionRecorder',
+	'ReplaySession',
+	'ReplayError',
+	'load_log',
+	'replay_log',
+]
+
+
+### CONSTANTS & DEFINES
+
+# the escape codes that style terminal text
+STYLE_CODE = re.compile (r'\x1b\[[0-9;]*[A-Za-z]')
+
+
+### IMPLEMENTATION ###
+
+class ReplayError (QandaError):
+	"""
+	A replayed session could not be continued, e.g. it ran out of answers.
+	"""
+	pass
+
+
+class SessionRecorder (Observer):
+	"""
+	Appends each question and its answers to a log.
+	"""
+
+	def __init__ (self, log):
+		"""
+		C'tor.
+
+		:Parameters:
+			log
+				The path of the log file, or an open file-like object. A path is
+				opened for appending, so several runs can share a log.
+		"""
+		if isinstance (log, basestring):
+			log = open (log, 'a')
+		self.log = log
+		self._started = False
+		self._asking = {}
+		# held while writing, and while the log is started by writing a header
+		self._lock = threading.RLock()
+
+	def question_asked (self, q, t):
+		with self._lock:
+			if not self._started:
+				self._write ({'session': time.time()})
+				self._started = True
+		self._asking[_asking_key (q)] = [None, []]
+
+	def prompt_rendered (self, q, t, text):
+		state = self._asking.get (_asking_key (q))
+		if (state is not None) and (state[0] is None):
+			state[0] = _unstyled (text)
+
+	def input_received (self, q, t, raw_answer):
+		state = self._asking.get (_asking_key (q))
+		if state is not None:
+			state[1].append (raw_answer)
+
+	def answer_accepted (self, q, t, value):
+		state = self._asking.pop (_asking_key (q), None)
+		if state is None:
+			return
+		self._write ({
+			'k': q.key,
+			'q': q.question,
+			'p': state[0],
+			'r': state[1],
+			'v': _loggable (value),
+		})
+
+	def question_failed (self, q, t, err):
+		# only answered questions can be replayed
+		self._asking.pop (_asking_key (q), None)
+
+	def close (self):
+		self.log.close()
+
+	def _write (self, record):
+		line = json.dumps (record, separators=(',', ':')) + '\n'
+		with self._lock:
+			self.log.write (line)
+			self.log.flush()
+
+
+class ReplaySession (Session):
+	"""
+	A session that answers questions from a recorded session.
+
+	Raw answers are given exactly as recorded, including those that failed,
+	and each prompt and final value is compared with that recorded. Any
+	differences are collected in `differences`.
+	"""
+
+	def __init__ (self, records, **kwargs):
+		"""
+		C'tor.
+
+		:Parameters:
+			records
+				The recorded questions of a session, as read by `load_log`.
+
+		Other arguments are as for `Session`. Prompts are not shown.
+		"""
+		kwargs.setdefault ('output', _NullOutput())
+		Session.__init__ (self, **kwargs)
+		self.records = deque (records)
+		self.differences = []
+		self._raw = deque()
+		self._prompt = None
+
+	def _ask_question (self, q):
+		return self._replay (q, Session._ask_question)
+
+	def _ask_choice_question (self, q):
+		return self._replay (q, Session._ask_choice_question)
+
+	def _replay (self, q, ask):
+		if not self.records:
+			raise ReplayError ("no recorded answer for '%s'" % q.question)
+		rec = self.records.popleft()
+		if rec['k'] != q.key:
+			self.differences.append ("asked '%s' but recording has '%s'" % (
+				q.key, rec['k']))
+		self._raw = deque (rec['r'])
+		self._prompt = None
+		value = ask (self, q)
+		prompt = _unstyled (self._prompt)
+		if (rec['p'] is not None) and (prompt != _unstyled (rec['p'])):
+			self.differences.append ("prompt for '%s' was %r, recorded %r" % (
+				q.key, prompt, rec['p']))
+		if _loggable (value) != rec['v']:
+			self.differences.append ("answer to '%s' was %r, recorded %r" % (
+				q.key, _loggable (value), rec['v']))
+		return value
+
+	def read_input_line (self, prompt, timeout=None, **kwargs):
+		if self._prompt is None:
+			self._prompt = prompt
+		if not self._raw:
+			raise ReplayError ("recorded answers ran out for prompt %r" % prompt)
+		return self._raw.popleft()
+
+	def read_input_multiline (self, prompt, timeout=None, **kwargs):
+		return self.read_input_line (prompt)
+
+
+class _NullOutput (object):
+	def write (self, text):
+		pass
+
+
+def _unstyled (text):
+	"""
+	Return text without any style codes.
+	"""
+	if text is None:
+		return None
+	return STYLE_CODE.sub ('', text)
+
+
+def _loggable (value):
+	"""
+	Return a value in a form that can be logged as JSON and compared.
+	"""
+	try:
+		return json.loads (json.dumps (value))
+	except (TypeError, ValueError):
+		return repr (value)
+
+
+def load_log (path):
+	"""
+	Read a session log, returning a list of the records of each session.
+	"""
+	sessions = []
+	with open (path) as in_hndl:
+		for line in in_hndl:
+			if not line.strip():
+				continue
+			rec = json.loads (line)
+			if 'session' in rec:
+				sessions.append ([])
+			elif sessions:
+				sessions[-1].append (rec)
+	return sessions
+
+
+def replay_log (path, script, **kwargs):
+	"""
+	Replay each session in a log through a script.
+
+	:Parameters:
+		path
+			The path to a log written by `SessionRecorder`.
+		script
+			A function that is called with a `ReplaySession` and asks the
+			questions of the recorded session.
+
+	Other arguments are passed to the `ReplaySession`. Returns a list of the
+	differences found, as strings prefixed by the number of the session.
+	"""
+	diffs = []
+	for i, records in enumerate (load_log (path)):
+		session = ReplaySession (records, **kwargs)
+		try:
+			script (session)
+		except ReplayError, err:
+			session.differences.append (str (err))
+		if session.records:
+			session.differences.append ("%s recorded questions not asked" %
+				len (session.records))
+		diffs.extend (["session %s: %s" % (i + 1, d)
+			for d in session.differences])
+	return diffs
+
+
+
+### END #######################################################################
@@ -0,0 +1,447 @@
+"""
+Serving conversations over a socket.
+
+A `PromptServer` hosts conversations (written as for `AsyncSession.run`) and
+serves them over a Unix or TCP socket, so that clients such as a web console,
+chat bot or remote shell can drive them without starting Python for each one.
+A single thread serves every connection, waiting on them with `select`::
+
+	def setup (session):
+		host = yield session.string ("Which host", qid='host')
+		port = yield session.integer ("Which port", min=1, max=65535)
+		raise StopIteration ({'host': host, 'port': port})
+
+	server = PromptServer ('/tmp/setup.sock', {'setup': setup})
+	server.serve_forever()
+
+The protocol is one JSON object per line in each direction. A client starts a
+conversation with ``{"start": name}`` and answers with ``{"answer": text}``.
+The server sends ``{"out": text, "key": key}`` for each prompt (where `key` is
+the id or text of the question being asked), and ends a conversation with
+``{"done": value}`` or ``{"error": message, "type": name}``. A connection can
+be used for any number of conversations, one after another.
+
+`PromptClient` is a simple blocking client, e.g. for testing::
+
+	client = PromptClient ('/tmp/setup.sock')
+	print client.run ('setup', ['localhost', '8080'])
+
+"""
+
+__docformat__ = "restructuredtext en"
+
+
+### IMPORTS
+
+import os
+import stat
+import json
+import errno
+import select
+import socket
+
+from asyncsession import AsyncSession
+from errors import QandaError
+
+__all__ = [
+	'PromptServer',
+	'PromptClient',
+	'ServerError',
+]
+
+
+### CONSTANTS & DEFINES
+
+# the name of the conversation, if a server is given only one
+DEFAULT_CONVERSATION = 'default'
+
+RECV_SIZE = 4096
+
+# the longest message a client may send, in bytes
+MAX_LINE = 1 << 20
+
+
+### IMPLEMENTATION ###
+
+class ServerError (QandaError):
+	"""
+	A conversation failed on the server, or the server could not be understood.
+	"""
+	pass
+
+
+class PromptServer (object):
+	"""
+	Serves conversations to many clients at once over a socket.
+	"""
+
+	def __init__ (self, address, conversations, backlog=socket.SOMAXCONN,
+			**kwargs):
+		"""
+		C'tor.
+
+		:Parameters:
+			address
+				The path of a Unix socket, or a (host, port) pair for TCP. A port
+				of 0 picks a free port, see `address`.
+			conversations
+				A dictionary of the functions that can be started, by name. Each
+				is called with an `AsyncSession` and returns a generator, as for
+				`AsyncSession.run`. A single function is served as 'default'.
+			backlog
+				The number of connections that may be waiting to be accepted.
+
+		Other arguments are passed to each `AsyncSession`. Styles are not used
+		unless asked for. Any timeout or deadline is applied by the server, so
+		a client that doesn't answer in time is sent the default or an error.
+		"""
+		if callable (conversations):
+			conversations = {DEFAULT_CONVERSATION: conversations}
+		self.conversations = conversations
+		kwargs.setdefault ('use_styles', False)
+		self.session_kwargs = kwargs
+		self.listener = _listen (address, backlog)
+		self.address = self.listener.getsockname()
+		self.connections = {}
+		self.running = False
+
+	def serve_forever (self, poll=0.5):
+		"""
+		Serve until `shutdown` is called.
+
+		:Parameters:
+			poll
+				How often (in seconds) to check for shutdown.
+		"""
+		self.running = True
+		while self.running:
+			self.handle (poll)
+
+	def shutdown (self):
+		"""
+		Stop serving, after any current handling. This may be called from
+		another thread.
+		"""
+		self.running = False
+
+	def handle (self, timeout=None):
+		"""
+		Wait for and handle activity on the sockets, once.
+
+		:Parameters:
+			timeout
+				The longest time to wait, in seconds, or None to wait until there
+				is activity. The wait is cut short if a question must be answered
+				sooner.
+		"""
+		## Main:
+		readers = [self.listener] + self.connections.keys()
+		writers = [s for s, c in self.connections.items() if c.outbox]
+		for conn in self.connections.values():
+			left = conn.session and conn.session.time_left()
+			if (left is not None) and ((timeout is None) or (left < timeout)):
+				timeout = left
+		try:
+			readable, writable, _ = select.select (readers, writers, [], timeout)
+		except select.error, err:
+			if err.args[0] == errno.EINTR:
+				return
+			raise
+		for sock in readable:
+			if sock is self.listener:
+				self._accept()
+				continue
+			conn = self.connections.get (sock)
+			if conn is None:
+				continue
+			try:
+				data = sock.recv (RECV_SIZE)
+			except socket.error, err:
+				if err.args[0] in (errno.EAGAIN, errno.EINTR):
+					continue
+				data = ''
+			if data:
+				conn.receive (data)
+			else:
+				self._drop (conn)
+		for sock in writable:
+			conn = self.connections.get (sock)
+			if conn is not None:
+				conn.flush()
+		for conn in self.connections.values():
+			if conn.session is not None:
+				conn.expire()
+
+	def close (self):
+		"""
+		Close all connections and stop listening.
+		"""
+		for conn in self.connections.values():
+			self._drop (conn)
+		self.listener.close()
+		if isinstance (self.address, basestring):
+			_remove_socket (self.address)
+
+	def _accept (self):
+		try:
+			sock, addr = self.listener.accept()
+		except socket.error, err:
+			if err.args[0] in (errno.EAGAIN, errno.EINTR):
+				return
+			raise
+		sock.setblocking (0)
+		self.connections[sock] = _Connection (self, sock)
+
+	def _drop (self, conn):
+		del self.connections[conn.sock]
+		if conn.session is not None:
+			conn.session.close()
+		conn.sock.close()
+
+
+class _Connection (object):
+	"""
+	A client connected to a server, and its current conversation (if any).
+	"""
+
+	def __init__ (self, server, sock):
+		self.server = server
+		self.sock = sock
+		self.session = None
+		self.result = None
+		self.outbox = []
+		self._partial = ''
+		# is the rest of a message that was too long being dropped?
+		self._skipping = False
+
+	def receive (self, data):
+		lines = (self._partial + data).split ('\n')
+		self._partial = lines.pop()
+		if self._skipping:
+			if not lines:
+				self._partial = ''
+				return
+			lines.pop (0)
+			self._skipping = False
+		for line in lines:
+			if line.strip():
+				self.handle_message (line)
+		if MAX_LINE < len (self._partial):
+			self._partial = ''
+			self._skipping = True
+			self.send ({'error': "message longer than %s bytes" % MAX_LINE,
+				'type': 'ServerError'})
+
+	def handle_message (self, line):
+		try:
+			msg = json.loads (line)
+			assert isinstance (msg, dict)
+		except (ValueError, AssertionError):
+			self.send ({'error': "not a JSON object: %r" % line[:80],
+				'type': 'ServerError'})
+			return
+		# whatever a client sends, or a conversation does, only this
+		# connection's conversation may fail, not the server
+		try:
+			if 'answer' in msg:
+				self.answer (msg['answer'])
+			elif 'start' in msg:
+				self.start (msg['start'])
+			else:
+				self.send ({'error': "unknown message: %r" % line[:80],
+					'type': 'ServerError'})
+		except Exception, err:
+			self.fail (err)
+
+	def answer (self, answer):
+		if self.session is None:
+			self.send ({'error': "no conversation to answer",
+				'type': 'ServerError'})
+			return
+		if not isinstance (answer, basestring):
+			self.send ({'error': "answer must be a string, not %r" % (answer,),
+				'type': 'ServerError'})
+			return
+		if isinstance (answer, unicode):
+			answer = answer.encode ('utf-8')
+		self.session.feed ('%s\n' % answer)
+
+	def start (self, name):
+		if self.session is not None:
+			self.send ({'error': "conversation already in progress",
+				'type': 'ServerError'})
+			return
+		if not isinstance (name, basestring):
+			self.send ({'error': "conversation name must be a string, not %r" %
+				(name,), 'type': 'ServerError'})
+			return
+		conversation = self.server.conversations.get (name)
+		if conversation is None:
+			self.send ({'error': "no conversation '%s'" % name,
+				'type': 'ServerError'})
+			return
+		self.session = AsyncSession (write=self.write,
+			**self.server.session_kwargs)
+		self.result = self.session.run (conversation (self.session))
+		self.result.add_callback (self.finished)
+
+	def expire (self):
+		"""
+		End the current question if its time to answer has run out.
+		"""
+		try:
+			self.session.expire()
+		except Exception, err:
+			self.fail (err)
+
+	def fail (self, err):
+		"""
+		End the current conversation (if any) with an error.
+		"""
+		session = self.session
+		self.session = None
+		self.result = None
+		if session is not None:
+			session.close()
+		self.send ({'error': str (err), 'type': err.__class__.__name__})
+
+	def write (self, text):
+		q = self.session.current
+		self.send ({'out': text, 'key': q and q.key})
+
+	def finished (self, result):
+		if result is not self.result:
+			# a conversation that has already failed
+			return
+		self.session = None
+		self.result = None
+		if result.error is None:
+			self.send ({'done': result.value})
+		else:
+			self.send ({'error': str (result.error),
+				'type': result.error.__class__.__name__})
+
+	def send (self, msg):
+		self.outbox.append (json.dumps (msg, default=repr) + '\n')
+
+	def flush (self):
+		data = ''.join (self.outbox)
+		try:
+			sent = self.sock.send (data)
+		except socket.error, err:
+			if err.args[0] in (errno.EAGAIN, errno.EINTR):
+				sent = 0
+			else:
+				self.server._drop (self)
+				return
+		data = data[sent:]
+		self.outbox = data and [data] or []
+
+
+class PromptClient (object):
+	"""
+	A blocking client for a `PromptServer`.
+	"""
+
+	def __init__ (self, address, timeout=None):
+		"""
+		C'tor.
+
+		:Parameters:
+			address
+				The address of the server, as given to `PromptServer`.
+			timeout
+				If given, how long to wait for the server, in seconds.
+		"""
+		if isinstance (address, basestring):
+			self.sock = socket.socket (socket.AF_UNIX, socket.SOCK_STREAM)
+			self.sock.settimeout (timeout)
+			self.sock.connect (address)
+		else:
+			self.sock = socket.create_connection (address, timeout)
+		self._in = self.sock.makefile ('r')
+
+	def send (self, msg):
+		self.sock.sendall (json.dumps (msg) + '\n')
+
+	def receive (self):
+		"""
+		Return the next message from the server.
+		"""
+		line = self._in.readline()
+		if not line:
+			raise EOFError ("server closed connection")
+		return json.loads (line)
+
+	def start (self, name=DEFAULT_CONVERSATION):
+		self.send ({'start': name})
+
+	def answer (self, text):
+		self.send ({'answer': text})
+
+	def run (self, name, answers, transcript=None):
+		"""
+		Hold a conversation, giving answers in turn to each prompt.
+
+		:Parameters:
+			name
+				The name of the conversation.
+			answers
+				The answers to give, in order.
+			transcript
+				If given, a list that each prompt is appended to.
+
+		Returns the result of the conversation, or raises `ServerError` if it
+		failed.
+		"""
+		answers = iter (answers)
+		self.start (name)
+		while True:
+			msg = self.receive()
+			if 'out' in msg:
+				if transcript is not None:
+					transcript.append (msg['out'])
+				try:
+					self.answer (answers.next())
+				except StopIteration:
+					raise ServerError ("no answer for prompt %r" % msg['out'])
+			elif 'done' in msg:
+				return msg['done']
+			else:
+				raise ServerError ("%s: %s" % (msg.get ('type'),
+					msg.get ('error')))
+
+	def close (self):
+		self._in.close()
+		self.sock.close()
+
+
+def _listen (address, backlog):
+	"""
+	Return a non-blocking socket listening on an address.
+	"""
+	if isinstance (address, basestring):
+		_remove_socket (address)
+		sock = socket.socket (socket.AF_UNIX, socket.SOCK_STREAM)
+	else:
+		sock = socket.socket (socket.AF_INET, socket.SOCK_STREAM)
+		sock.setsockopt (socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+	sock.bind (address)
+	sock.listen (backlog)
+	sock.setblocking (0)
+	return sock
+
+
+def _remove_socket (path):
+	"""
+	Remove a Unix socket left from an earlier server, but nothing else.
+	"""
+	try:
+		if stat.S_ISSOCK (os.stat (path).st_mode):
+			os.unlink (path)
+	except OSError:
+		pass
+
+
+
+### END #######################################################################
@@ -28,12 +28,21 @@ __docformat__ = "restructuredtext en"
 
 ### IMPORTS
 
+import sys
 import types
-
-import konval
-from konval.impl import make_list
+import threading
+import time
+import os
+import select
+import stat
 
 import defs
+from question import Question, ChoiceQuestion, TextQuestion
+from errors import ConversionError, AnswerError, NoAnswerError, InputTimeout, \
+	TooManyAttempts
+from observers import clock
+from convert import pure, ConverterChain, ConverterFailure, \
+	ChoiceLookup, choice_lookup, yesno_lookup
 
 __all__ = [
 	'Session',
@@ -43,6 +52,25 @@ __all__ = [
 
 ### CONSTANTS & DEFINES
 
+# the number of threads in the pool shared by sessions for slow converters
+OFFLOAD_THREADS = 4
+
+# how long (in seconds) a slow converter runs before a spinner is shown, and
+# how often it turns
+SPINNER_DELAY = 0.2
+SPINNER_INTERVAL = 0.1
+SPINNER_FRAMES = '|/-\\'
+
+_offload_pool = None
+_offload_lock = threading.Lock()
+
+# the most pages of matches found when searching choices
+SEARCH_PAGES = 5
+
+# the most input read from a file descriptor at once
+READ_SIZE = 65536
+
+
 ### IMPLEMENTATION ###
 
 class Session (object):
@@ -51,75 +79,422 @@ class Session (object):
 	
 	This "holds" all the different Q-and-A methods, allowing them to be formatted
 	consistently and customized to together. 
+
+	A session may be shared between threads. Its settings (styles, delimiters
+	and so on) are shared and should be set before use, but each thread can
+	talk through its own streams or answers via `use`.
 	"""
-	# XXX: in future, this may include initialization of readline etc.
+	def __init__ (self, use_styles=True, styles={}, answers=None, input=None,
+			output=None, cache_size=0, store=None, trust_store=False,
+			timeout=None, deadline=None, max_attempts=None, fail_fast=False,
+			pool=None, history=False):
+		"""
+		C'tor.
 
-	def __init__ (self, use_styles=True, styles={}):
+		:Parameters:
+			use_styles
+				Should text be colored and styled, if colorama is available? If
+				true, styles are only used if the output is a terminal. If
+				'always', they are used whatever the output.
+			styles
+				Styles to use in place of the defaults, keyed by element.
+			answers
+				If given, answers are taken from here rather than asking the user.
+				This may be anything accepted by `make_answer_source`, e.g. a
+				dictionary, a list or the path to an answers file.
+			input
+				A file-like object that answers are read from, a line at a time.
+			output
+				A file-like object that prompts are written to. This need only have
+				a `write` method.
+			cache_size
+				If non-zero, the results of pure converters are cached for this
+				many different answers to each question. See `qanda.convert`.
+			store
+				If given, an `AnswerStore` (or the path of one) that accepted
+				answers to questions with an id are saved in. A saved answer
+				becomes the default the next time the question is built.
+			trust_store
+				If true and the session has an answer source, questions with a
+				saved answer are answered from the store without consulting the
+				source.
+			timeout
+				If given, the number of seconds to wait for each answer. Questions
+				may have their own timeout.
+			deadline
+				If given, the time (as per `time.time`) by which all questions
+				must be answered.
+			max_attempts
+				If given, the number of wrong answers allowed to a question before
+				giving up with a `TooManyAttempts` error.
+			fail_fast
+				If true and the input is not a terminal (e.g. piped or scripted),
+				give up on the first wrong answer, as asking again will not help.
+			pool
+				A pool (e.g. a `multiprocessing.Pool`) that the converters of
+				questions with converters marked by `offload` are run in. If not
+				given, a pool of threads shared by all sessions is used.
+			history
+				If true, every answer accepted is recorded in `history`, an
+				`AnswerHistory`. An existing history may be given instead.
+
+		If neither input nor output are given, the terminal is used via
+		`raw_input`, allowing line-editing if readline is available. Otherwise,
+		stdin and stdout are used in place of whichever is missing.
+
+		If no answer is given in time, the question's default is used or, if
+		it has none, an `InputTimeout` is raised. Waiting for an answer in time
+		uses `select` on the input stream, so needs a stream with a file
+		descriptor (and on Windows, a socket). Streams without one are read as
+		usual.
+
+		Colorama and the default styles are only loaded when a question is first
+		rendered, so creating a session is cheap.
+		"""
 		self.choice_delim = '/'
-		self.use_styles = use_styles and defs.COLORAMA_AVAILABLE
-		self.styles = dict (defs.DEFAULT_STYLES)
-		self.styles.update (styles)
+		self.use_styles = use_styles
+		self.styles = dict (styles)
+		# keyed by whether styles are shown, so threads can share them
+		self._style_tables = {}
+		self._local = _Context()
+		self.input = input
+		self.output = output
+		self.observers = []
+		self.histories = {}
+		self.cache_size = cache_size
+		self._chains = {}
+		self.answers = None
+		if answers is not None:
+			from answers import make_answer_source
+			self.answers = make_answer_source (answers)
+		if isinstance (store, basestring):
+			from store import AnswerStore
+			store = AnswerStore (store)
+		self.store = store
+		self.trust_store = trust_store
+		self.timeout = timeout
+		self.deadline = deadline
+		self.max_attempts = max_attempts
+		self.fail_fast = fail_fast
+		self.pool = pool
+		self.history = None
+		if history is True:
+			from history import AnswerHistory
+			history = AnswerHistory()
+		# a history given may be empty and so false
+		if (history is not None) and (history is not False):
+			self.history = history
+			self.add_observer (history)
+
+	def _context_attr (name, doc):
+		# an attribute that may be replaced for the current thread by `use`
+		key = '_' + name
+		def get (self):
+			value = getattr (self._local, name)
+			if value is None:
+				return self.__dict__[key]
+			return value
+		def set (self, value):
+			self.__dict__[key] = value
+		return property (get, set, doc=doc)
+
+	input = _context_attr ('input',
+		"The stream answers are read from, or None for the terminal.")
+	output = _context_attr ('output',
+		"The stream prompts are written to, or None for the terminal.")
+	answers = _context_attr ('answers',
+		"The source of answers, or None to ask the user.")
+	deadline = _context_attr ('deadline',
+		"The time by which questions must be answered, or None.")
+
+	del _context_attr
+
+	def use (self, input=None, output=None, answers=None, deadline=None):
+		"""
+		Use other streams or answers in the current thread.
+
+		:Parameters:
+			input
+				A file-like object that answers are read from.
+			output
+				A file-like object that prompts are written to.
+			answers
+				Anything accepted by `make_answer_source`.
+			deadline
+				The time by which questions must be answered.
+
+		Returns a context manager, within which questions asked through this
+		session in this thread use whichever of these are given, while other
+		threads are unaffected. For example::
+
+			def worker (channel):
+				with prompt.use (input=channel.rfile, output=channel.wfile):
+					name = prompt.string ("What is your name")
+
+		"""
+		if answers is not None:
+			from answers import make_answer_source
+			answers = make_answer_source (answers)
+		return _Using (self._local, input=input, output=output, answers=answers,
+			deadline=deadline)
+
+	def add_observer (self, observer):
+		"""
+		Add an `Observer` to be told of the events in asking questions.
+		"""
+		self.observers.append (observer)
+
+	def remove_observer (self, observer):
+		self.observers.remove (observer)
+
+	def compile (self, kind, question, **kwargs):
+		"""
+		Build a question that can be asked repeatedly.
+
+		:Parameters:
+			kind
+				The type of question, named after the question method that would
+				otherwise be used to ask it, e.g. 'string', 'integer', 'long_choice'.
+			question
+				The text of the question asked.
+
+		Any other keyword arguments are those of the corresponding question method.
+		Returns a `Question`, whose `ask` method poses the question and returns
+		the answer. All rendering of help, menus, hints and the question line and
+		the building of converters is done here once, rather than on each asking.
+
+		For example::
+
+			>>> q = prompt.compile ('yesno', "Restart the server")
+			>>> q
+			<Question 'Restart the server'>
+
+		"""
+		builder = getattr (self, '_build_%s' % kind, None)
+		assert builder, "unknown question type '%s'" % kind
+		return builder (question, **kwargs)
+
+	def validate_many (self, question, answers):
+		"""
+		Process many answers to a question at once, e.g. a column of an import.
+
+		:Parameters:
+			question
+				A `Question`, as returned by `compile`.
+			answers
+				A sequence of raw answers.
+
+		Each answer is cleaned, defaulted and converted as if it had been given
+		to the question, but without observers, the answer store or asking
+		again. Integer and choice questions are handled in bulk (with NumPy for
+		integers, if it is available). Returns a list of the converted values
+		(None for those that failed) and a bytearray with 1 for each answer
+		that failed and 0 for the rest. See `qanda.bulk`.
+		"""
+		from bulk import validate_many
+		return validate_many (question, answers)
 
 	## Questions:
 	def string (self, question, converters=[], help=None, hints=None,
 			default=None, default_value=None,
-			strip_flanking_space=False):
+			strip_flanking_space=False, qid=None,
+			timeout=None, completions=None):
 		"""
 		Ask for and return text from the user.
 
 		The simplest public question function and the basis of many of the others,
 		this is a thin wrapper around the core `_ask` method that
 
+		:Parameters:
+			completions
+				Candidate answers, completed with the tab key on the terminal.
+				This may be a sequence, a function returning the candidates for
+				a prefix, or an object with such a `complete` method. See
+				`qanda.completion`.
 		"""
-		return self._ask (question,
+		return self._build_string (question,
 			converters=converters,
 			help=help,
 			hints=hints,
 			default=default,
 			default_value=default_value,
+			qid=qid,
+			timeout=timeout,
 			strip_flanking_space=strip_flanking_space,
-			multiline=False,
-		)
+			completions=completions,
+		).ask()
 
 	def text (self, question, converters=[],
 			help=None, hints=None,
 			default=None, default_value=None,
-			strip_flanking_space=False):
+			strip_flanking_space=False, qid=None,
+			timeout=None, terminator=None, max_size=None, as_lines=False):
 		"""
 		Ask for and return text from the user.
 		
 		The simplest public question function and the basis of many of the others,
 		this is a thin wrapper around the core `_ask` method that allows for
 		multi-line responses.
-		
+
+		:Parameters:
+			terminator
+				A line that ends the text, e.g. '.' or 'EOF'. By default, text is
+				ended by two blank lines.
+			max_size
+				If given, the most characters the text may have. Longer text is
+				read to the end but not kept, and the question is asked again.
+			as_lines
+				If true, the converters are passed an iterator over the lines of
+				the text rather than a single string, and flanking space is not
+				stripped.
+
+		A blank first line gives a blank answer, so any default is used.
 		"""
-		return self._ask (question,
-			converters=[],
+		return self._build_text (question,
+			converters=converters,
 			help=help,
 			hints=hints,
 			default=default,
 			default_value=default_value,
+			qid=qid,
+			timeout=timeout,
 			strip_flanking_space=strip_flanking_space,
-			multiline=True,
-		)
+			terminator=terminator,
+			max_size=max_size,
+			as_lines=as_lines,
+		).ask()
 
 	def integer (self, question, converters=[], help=None, hints=None,
-			default=None, default_value=None, min=None, max=None):
-		return self.string (question,
-			converters=[konval.ToInt(), konval.Range (min, max)] + converters,
+			default=None, default_value=None, min=None, max=None, qid=None,
+			timeout=None):
+		return self._build_integer (question,
+			converters=converters,
 			help=help,
 			hints=hints,
 			default=default,
 			default_value=default_value,
-			strip_flanking_space=True,
-		)
-
+			qid=qid,
+			timeout=timeout,
+			min=min,
+			max=max,
+		).ask()
 
 	def short_choice (self, question, choice_str, converters=[], help=None,
-			default=None, default_value=None, err_msg=None):
+			default=None, default_value=None, err_msg=None, qid=None,
+			timeout=None):
 		"""
 		Ask the user to make a choice using single letters.
 		"""
+		return self._build_short_choice (question, choice_str,
+			converters=converters,
+			help=help,
+			default=default,
+			default_value=default_value,
+			qid=qid,
+			timeout=timeout,
+			err_msg=err_msg,
+		).ask()
+
+	def yesno (self, question, help=None, default=None, default_value=None,
+			qid=None,
+			timeout=None):
+		return self._build_yesno (question,
+			help=help,
+			default=default,
+			default_value=default_value,
+			qid=qid,
+			timeout=timeout,
+		).ask()
+
+	def long_choice (self, question, choices, help=None, default=None,
+			default_value=None, qid=None, page_size=None,
+			timeout=None):
+		"""
+		Ask the user to make a choice from a list.
+
+		A choice is a list of strings and/or pairs of strings. If a pair is
+		provided, the first is the visible string, the second the actual returned
+		value. If only a string is provided, it is used for both.
+
+		For long lists, the choices can be a `ChoiceIndex` or a page size can be
+		given. Then only a page of choices is shown at a time, the user can page
+		through them or type part of a label to search, and a choice may be made
+		by number, label or value. Choices that should not all be held in memory
+		can be given as a `LazyChoices`, an iterator or generator, or a function
+		to fetch a page of choices (see `LazyChoices`).
+		"""
+		return self._build_long_choice (question, choices,
+			help=help,
+			default=default,
+			default_value=default_value,
+			qid=qid,
+			timeout=timeout,
+			page_size=page_size,
+		).ask()
+
+	## Question builders:
+	# These do the work of the question methods, up to the point of asking.
+	def _build_string (self, question, converters=[], help=None, hints=None,
+			default=None, default_value=None,
+			strip_flanking_space=False, qid=None,
+			timeout=None, completions=None):
+		completer = None
+		if completions is not None:
+			from completion import make_completer
+			completer = make_completer (completions)
+		return self._question (question,
+			converters=converters,
+			help=help,
+			hints=hints,
+			default=default,
+			default_value=default_value,
+			qid=qid,
+			timeout=timeout,
+			strip_flanking_space=strip_flanking_space,
+			multiline=False,
+			completer=completer,
+		)
+
+	def _build_text (self, question, converters=[],
+			help=None, hints=None,
+			default=None, default_value=None,
+			strip_flanking_space=False, qid=None,
+			timeout=None, terminator=None, max_size=None, as_lines=False):
+		return self._question (question,
+			converters=converters,
+			help=help,
+			hints=hints,
+			default=default,
+			default_value=default_value,
+			qid=qid,
+			timeout=timeout,
+			strip_flanking_space=strip_flanking_space and not as_lines,
+			multiline=True,
+			cls=TextQuestion,
+			terminator=terminator,
+			max_size=max_size,
+			as_lines=as_lines,
+		)
+
+	def _build_integer (self, question, converters=[], help=None, hints=None,
+			default=None, default_value=None, min=None, max=None, qid=None,
+			timeout=None):
+		chain = self._builtin_chain (('integer', min, max), converters,
+			lambda: _pure_konval ('ToInt') + _pure_konval ('Range', min, max))
+		return self._build_string (question,
+			converters=chain,
+			help=help,
+			hints=hints,
+			default=default,
+			default_value=default_value,
+			qid=qid,
+			timeout=timeout,
+			strip_flanking_space=True,
+		)
+
+	def _build_short_choice (self, question, choice_str, converters=[],
+			help=None, default=None, default_value=None, err_msg=None, qid=None,
+			timeout=None):
 		## Preconditions:
 		choice_str = choice_str.strip().lower()
 		assert choice_str, "need choices for question"
@@ -131,42 +506,79 @@ class Session (object):
 		hints = choice_str
 		err_msg = err_msg or "choice must be from '%s'" % choice_str
 		## Postconditions & return:
-		return self._ask (question,
-			converters = converters or [konval.IsInVocab(list(choice_str))],
+		return self._question (question,
+			converters=converters or self._builtin_chain (
+				('short_choice', choice_str), [],
+				lambda: [choice_lookup (choice_str)]),
 			help=help, hints=hints,
 			default=default, default_value=default_value,
+			qid=qid,
+			timeout=timeout,
 			err_msg=err_msg,
+			completer=choice_lookup (choice_str),
 		)
 
-
-	def yesno (self, question, help=None, default=None, default_value=None):
+	def _build_yesno (self, question, help=None, default=None,
+			default_value=None, qid=None,
+			timeout=None):
 		choice_str = 'yn'
-		return self.short_choice (question, choice_str,
-			converters=[konval.StrToBool()],
+		return self._build_short_choice (question, choice_str,
+			converters=self._builtin_chain (('yesno',), [],
+				lambda: [yesno_lookup()]),
 			help=help,
 			default=default,
 			default_value=default_value,
+			qid=qid,
+			timeout=timeout,
 			err_msg="choice must be yes or no",
 		)
 
-	def long_choice (self, question, choices, help=None, default=None,
-			default_value=None):
-		"""
-		Ask the user to make a choice from a list.
-
-		A choice is a list of strings and/or pairs of strings. If a pair is
-		provided, the first is the visible string, the second the actual returned
-		value. If only a string is provided, it is used for both.
-		"""
+	def _build_long_choice (self, question, choices, help=None, default=None,
+			default_value=None, qid=None, page_size=None,
+			timeout=None):
 		## Preconditions:
 		assert choices, "need choices for question"
 		if default:
 			default = default.lower()
 		## Main:
+		from choices import ChoiceIndex, LazyChoices, DEFAULT_PAGE_SIZE
+		if not isinstance (choices, (ChoiceIndex, LazyChoices)):
+			if callable (choices) or not hasattr (choices, '__len__'):
+				# a page function or stream of choices
+				choices = LazyChoices (choices)
+			elif page_size:
+				choices = ChoiceIndex (choices)
+		if isinstance (choices, (ChoiceIndex, LazyChoices)):
+			# a lazy window can change, so only a full index is pure
+			if isinstance (choices, ChoiceIndex):
+				convert = pure (choices.convert)
+			else:
+				convert = choices.convert
+			total = choices.total()
+			if total is None:
+				hints = 'a number'
+				err_msg = "choice must be one of the numbered choices"
+			else:
+				hints = '1-%s' % total
+				err_msg = "choice must be from 1-%s" % total
+			return self._question (question,
+				converters=[convert],
+				help=help,
+				hints=hints,
+				default=default,
+				default_value=default_value,
+				qid=qid,
+				timeout=timeout,
+				err_msg=err_msg,
+				cls=ChoiceQuestion,
+				completer=isinstance (choices, ChoiceIndex) and choices or None,
+				index=choices,
+				page_size=page_size or DEFAULT_PAGE_SIZE,
+			)
 		# build choices list
+		from konval.impl import make_list
 		choices = [make_list(x) for x in choices]
 		syns = {}
-		vocab = []
 		menu = []
 		for i, c in enumerate (choices):
 			menu_index = str(i + 1)
@@ -174,20 +586,42 @@ class Session (object):
 			menu.append ("%s. %s" % (menu_index, c[0]))
 		
 		## Postconditions & return:
-		return self._ask (question,
-			converters=[
-				konval.IsInVocab ([str(x+1) for x in range(len(choices))]),
-				konval.ToSynonym (syns),
-			],
+		return self._question (question,
+			converters=[ChoiceLookup (syns)],
 			help=help,
 			choices = menu,
 			hints='1-%s' % len(choices),
 			default=default,
 			default_value=default_value,
+			qid=qid,
+			timeout=timeout,
 			err_msg="choice must be from 1-%s" % len(choices),
 		)
 
 	## Internals
+	def _builtin_chain (self, key, converters, make):
+		"""
+		Return the compiled converters for a built-in question type.
+
+		:Parameters:
+			key
+				Identifies the type of question and its settings.
+			converters
+				Any extra converters, which are called after the built-in ones.
+			make
+				A function that returns the built-in converters.
+
+		Without extra converters, the chain (and so any cached results) is
+		shared by every question of the same type and settings.
+		"""
+		if converters:
+			return ConverterChain (make() + list (converters), self.cache_size)
+		chain = self._chains.get (key)
+		if chain is None:
+			chain = ConverterChain (make(), self.cache_size, kind=key)
+			self._chains[key] = chain
+		return chain
+
 	def _ask (self, question, converters=[],
 			choices=[],
 			help=None, hints=None,
@@ -195,6 +629,8 @@ class Session (object):
 			multiline=False,
 			strip_flanking_space=True,
 			err_msg=None,
+			qid=None,
+			timeout=None,
 		):
 		"""
 		Ask for and return an answer from the user.
@@ -219,6 +655,13 @@ class Session (object):
 			strip_flanking_space
 				If true, flanking space will be stripped from the answer before it is
 				processed.
+			qid
+				An optional identifier for the question, used to look up answers
+				from an answer source.
+			timeout
+				If given, the number of seconds to wait for an answer, in place of
+				the session's timeout. If none is given in time, the default is
+				used or, if there is none, an `InputTimeout` is raised.
 		
 		This is the underlying function for getting information from the user. It
 		prints the help text (if any), any menu of choices, prints the question
@@ -250,69 +693,429 @@ class Session (object):
 		impossible to set the default or default value to None as this is used
 		to test whether they have been set.
 
+		"""
+		return self._question (question,
+			converters=converters,
+			choices=choices,
+			help=help,
+			hints=hints,
+			default=default,
+			default_value=default_value,
+			multiline=multiline,
+			strip_flanking_space=strip_flanking_space,
+			err_msg=err_msg,
+			qid=qid,
+			timeout=timeout,
+		).ask()
+
+	def _question (self, question, converters=[],
+			choices=[],
+			help=None, hints=None,
+			default=None, default_value=None, 
+			multiline=False,
+			strip_flanking_space=True,
+			err_msg=None,
+			qid=None,
+			timeout=None,
+			cls=Question,
+			**kwargs
+		):
+		"""
+		Render a question for asking, without asking it.
+
+		Takes the same parameters as `_ask` and returns a `Question`, or an
+		instance of `cls` which is passed any additional keyword arguments. All
+		the formatting of the help, menu and question line is done here.
 		"""
 		## Preconditions:
 		assert (question), "'ask' requires a question"
 
 		## Main:
-		# show leadin
+		# a remembered answer replaces any default
+		if (self.store is not None) and (qid is not None):
+			remembered = self.store.get (qid)
+			if remembered is not None:
+				default = remembered
+				default_value = None
+
+		# styles are templates for each element, or empty if unstyled
+		styles = self.use_styles and self._get_style_table()
+
+		# build leadin
+		leadin = []
 		if help:
-			print "%s%s%s" % (
-				self.set_style ('HELP'),
-				self._clean_text (help), 
-				self.reset_style()
-			)
-		for c in choices:
-			print "   %s%s%s" % (
-				self.set_style ('CHOICES'), 
-				c.lstrip(),
-				self.reset_style()
-			)
+			help = self._clean_text (help)
+			if styles:
+				help = styles['HELP'] % help
+			leadin.append (help)
+		if choices:
+			if styles:
+				choice_tmpl = '   ' + styles['CHOICES']
+				leadin.extend ([choice_tmpl % c.lstrip() for c in choices])
+			else:
+				leadin.extend (['   ' + c.lstrip() for c in choices])
 			
 		# build actual question line
-		question_str = self._clean_text (
-			"%(q_style)s%(q)s%(reset)s%(hint)s%(q_style)s:%(reset)s" % {
-				'q':         question, 
-				'q_style':   self.set_style('QUESTION'),
-				'hint':      self._format_hints_text (hints, default, default_value),
-				'reset':     self.reset_style(),
-			}
+		hint = self._format_hints_text (hints, default, default_value)
+		if styles:
+			q_tmpl = styles['QUESTION']
+			question_str = (q_tmpl % question) + hint + (q_tmpl % ':')
+		else:
+			question_str = question + hint + ':'
+		question_str = self._clean_text (question_str)
+
+		## Postconditions & return:
+		return cls (self, question,
+			leadin='\n'.join (leadin),
+			question_str=question_str,
+			converters=converters,
+			default=default,
+			default_value=default_value,
+			multiline=multiline,
+			strip_flanking_space=strip_flanking_space,
+			err_msg=err_msg,
+			qid=qid,
+			timeout=timeout,
+			cache_size=self.cache_size,
+			**kwargs
 		)
+
+	def _ask_question (self, q):
+		"""
+		Ask a rendered question until a valid answer is given.
+
+		See `_ask` for the sequence used in processing answers. If the session
+		has an answer source, the answer is taken from that instead.
+		"""
+		return self._observe_asking (q, self._ask_until_valid)
+
+	def _observe_asking (self, q, ask):
+		"""
+		Answer a question with a function, telling observers of the outcome.
+
+		Observers are told the question is asked and, if it ends with an error
+		rather than an answer, of that error.
+		"""
+		if self.observers:
+			self._notify ('question_asked', q)
+		try:
+			if self.answers is not None:
+				return self._answer_from_source (q)
+			return ask (q)
+		except Exception, err:
+			if self.observers:
+				self._notify ('question_failed', q, err)
+			raise
+
+	def _ask_until_valid (self, q):
+		# the leadin, and any error, is shown in the same write as the question
+		shown = q.leadin and (q.leadin + '\n')
 		
-		err_msg = err_msg or "%(err)s"
-		
-		# ask question until you get a valid answer
+		# ask question until you get a valid answer, or too many invalid ones
+		attempts = []
 		while True:
-			if multiline:
-				raw_answer = self.read_input_multiline (question_str)
-			else:
-				raw_answer = self.read_input_line (question_str)
-			if strip_flanking_space:
-				raw_answer = raw_answer.strip()
-			# if the answer is blank and a default has been supplied
-			# NOTE: makes it impossible to have a default value of None
-			if (raw_answer == ''):
-				if (default_value is not None):
-					# return default value immediately
-					return default_value
-				if (default is not None):
-					# send default for processing
-					raw_answer = default
+			if self.observers:
+				self._notify ('prompt_rendered', q, shown + q.question_str)
+			# text that is too long fails as it is read
+			raw_answer = None
 			try:
-				for conv in converters:
-					raw_answer = conv.__call__ (raw_answer)
+				raw_answer = self._read_answer (q, shown + q.question_str)
+				return self._process_answer (q, raw_answer)
+			except ConversionError, err:
+				self._failed_attempt (q, raw_answer, err, attempts)
+				shown = self._format_error (err)
+
+	def _ask_choice_question (self, q):
+		"""
+		Ask a question on an indexed list of choices.
+
+		A page of choices is shown and then the answer is looked up. If it does
+		not select a choice, it is used to search and the best few pages of
+		matching choices are shown. '>' and '<' move between pages.
+		"""
+		return self._observe_asking (q, self._ask_choice_until_valid)
+
+	def _ask_choice_until_valid (self, q):
+		index = q.index
+		listing = None
+		start = 0
+		attempts = []
+		shown = q.leadin and (q.leadin + '\n')
+		while True:
+			shown += self._render_choice_page (index, listing, start,
+				q.page_size) + '\n'
+			while True:
+				if self.observers:
+					self._notify ('prompt_rendered', q, shown + q.question_str)
+				raw_answer = self._read_answer (q, shown + q.question_str)
+				shown = ''
+				text = raw_answer.strip()
+				if text in ('>', '<'):
+					step = (text == '>') and q.page_size or -q.page_size
+					new_start = start + step
+					if listing is None:
+						has_page = index.rows (new_start, new_start + 1)
+					else:
+						has_page = new_start < len (listing)
+					if (0 <= new_start) and has_page:
+						start = new_start
+						break
+					continue
+				try:
+					return self._process_answer (q, raw_answer)
+				except ConversionError, err:
+					matches = text and index.search (text,
+						SEARCH_PAGES * q.page_size)
+					if matches:
+						listing = matches
+						start = 0
+						break
+					self._failed_attempt (q, raw_answer, err, attempts)
+					shown = self._format_error (err)
+
+	def _render_choice_page (self, index, listing, start, page_size):
+		"""
+		Format a page of choices from an index.
+
+		:Parameters:
+			index
+				The `ChoiceIndex` or `LazyChoices` the choices are from.
+			listing
+				A sequence of the indices of the choices being shown, or None for
+				all of them.
+			start
+				The position in the listing of the first choice on the page.
+			page_size
+				The number of choices on a page.
+		"""
+		styles = self.use_styles and self._get_style_table()
+		if listing is None:
+			rows = index.rows (start, start + page_size)
+			total = index.total()
+		else:
+			rows = [(i, index.label (i)) for i in
+				listing[start:start + page_size]]
+			total = len (listing)
+		if styles:
+			choice_tmpl = '   ' + styles['CHOICES']
+			lines = [choice_tmpl % ("%s. %s" % (i + 1, label))
+				for i, label in rows]
+		else:
+			lines = ["   %s. %s" % (i + 1, label) for i, label in rows]
+		if total is None:
+			total = 'more'
+		lines.append ("   (%s-%s of %s; enter a number or name, text to search, "
+			"'>' or '<' to page)" % (start + 1, start + len (rows), total))
+		return '\n'.join (lines)
+
+	def _failed_attempt (self, q, raw_answer, err, attempts):
+		"""
+		Record a wrong answer, raising `TooManyAttempts` if that is too many.
+
+		If the answer was never complete (e.g. text that was too long), it is
+		given as None and the value in the error recorded.
+		"""
+		if raw_answer is None:
+			raw_answer = err.bad_val
+		attempts.append ((raw_answer, str (err)))
+		limit = self.max_attempts
+		if self.fail_fast and (not self._input_is_tty()):
+			limit = 1
+		if limit and (limit <= len (attempts)):
+			raise TooManyAttempts (q.question, attempts)
+
+	def _input_is_tty (self):
+		"""
+		Is the input from a terminal?
+		"""
+		isatty = getattr (self.input or sys.stdin, 'isatty', None)
+		return bool (isatty and isatty())
+
+	def _read_answer (self, q, prompt):
+		"""
+		Show the prompt for a question and read the answer, within any timeout.
+
+		If the time runs out, a blank answer is returned if the question has a
+		default, otherwise an `InputTimeout` is raised.
+		"""
+		## Main:
+		timeout = q.timeout
+		if timeout is None:
+			timeout = self.timeout
+		deadline = self.deadline
+		if deadline is not None:
+			left = max (deadline - time.time(), 0)
+			if (timeout is None) or (left < timeout):
+				timeout = left
+		# only what is set is passed, so readers overridden without these
+		# arguments still work for questions that don't use them
+		kwargs = {}
+		if timeout is not None:
+			kwargs['timeout'] = timeout
+		try:
+			if q.multiline:
+				for name, default in (('terminator', None), ('max_size', None),
+						('as_lines', False)):
+					value = getattr (q, name)
+					if value != default:
+						kwargs[name] = value
+				return self.read_input_multiline (prompt, **kwargs)
+			history = None
+			if q.qid is not None:
+				history = self.histories.setdefault (q.qid, [])
+			# only used on the terminal, so passed aside (see read_input_line)
+			self._local.completion = (q.completer, history)
+			try:
+				return self.read_input_line (prompt, **kwargs)
+			finally:
+				self._local.completion = None
+		except InputTimeout:
+			# finish the prompt line
+			self.write ('\n')
+			if (q.default is None) and (q.default_value is None):
+				raise InputTimeout (q.question, timeout)
+			return ''
+
+	def _format_error (self, err):
+		"""
+		Format the message shown when an answer is rejected.
+		"""
+		msg = "A problem: %s. Try again ..." % err
+		styles = self.use_styles and self._get_style_table()
+		if styles:
+			msg = styles['ERROR'] % msg
+		return msg + '\n'
+
+	def _answer_from_source (self, q):
+		"""
+		Answer a question from the session's answer source.
+
+		Nothing is shown. As there is no one to re-ask, an invalid or missing
+		answer raises an `AnswerError`.
+		"""
+		raw_answer = None
+		if self.trust_store and (self.store is not None) and \
+				(q.qid is not None):
+			raw_answer = self.store.get (q.qid)
+		if raw_answer is None:
+			raw_answer = self.answers.get (q)
+		if raw_answer is None:
+			if (q.default is None) and (q.default_value is None):
+				raise NoAnswerError (q.question)
+			raw_answer = ''
+		try:
+			return self._process_answer (q, raw_answer)
+		except ConversionError, err:
+			raise AnswerError (q.question, raw_answer, err)
+
+	def _process_answer (self, q, raw_answer):
+		"""
+		Clean, default and convert a raw answer to a question.
+
+		Returns the processed answer or raises a `ConversionError` with the
+		formatted error message if the answer is not acceptable.
+		"""
+		observed = bool (self.observers)
+		if observed:
+			self._notify ('input_received', q, raw_answer)
+		if q.strip_flanking_space:
+			raw_answer = raw_answer.strip()
+		# if the answer is blank and a default has been supplied
+		# NOTE: makes it impossible to have a default value of None
+		if (raw_answer == ''):
+			if (q.default_value is not None):
+				# return default value immediately
+				if observed:
+					self._notify ('answer_accepted', q, q.default_value)
+				return q.default_value
+			if (q.default is not None):
+				# send default for processing
+				raw_answer = q.default
+		accepted = raw_answer
+		if q.as_lines:
+			if isinstance (raw_answer, basestring):
+				raw_answer = raw_answer.split ('\n')
+			raw_answer = iter (raw_answer)
+		# observers are told of the chain as a whole, so it is called (and any
+		# results cached) the same way whether observed or not, and outside
+		# the conversion, so an error in an observer isn't taken for a bad answer
+		if observed:
+			self._notify ('converter_start', q, q.convert, raw_answer)
+		try:
+			try:
+				if q.convert.offloaded:
+					raw_answer = self._run_offloaded (q.convert, raw_answer)
+				else:
+					raw_answer = q.convert (raw_answer)
+			except ConversionError:
+				# a cancelled conversion
+				raise
+			except ConverterFailure, fail:
+				raise ConversionError (q.err_msg % {
+					'err': fail.error,
+					'bad_val': fail.value,
+				}, fail.value)
 			except StandardError, err:
-				message = err_msg % {
+				raise ConversionError (q.err_msg % {
 					'err': err,
 					'bad_val': raw_answer,
-				}
-				print "%sA problem: %s. Try again ...%s" % (self.set_style('ERROR'),
-					message, self.reset_style())
-			except:
-				print "%sA problem: unknown error. Try again ...%s" % (
-					self.set_style('ERROR'), self.reset_style())
-			else:
-				return raw_answer
+				}, raw_answer)
+			except Exception:
+				raise ConversionError ("unknown error", raw_answer)
+		except ConversionError, err:
+			if observed:
+				self._notify ('validation_failed', q, raw_answer, err)
+			raise
+		if observed:
+			self._notify ('converter_end', q, q.convert, raw_answer)
+		if (self.store is not None) and (q.qid is not None) and \
+				(not q.multiline):
+			self.store.put (q.qid, accepted)
+			# the session may never close the store, so each answer is kept
+			self.store.sync()
+		if observed:
+			self._notify ('answer_accepted', q, raw_answer)
+		return raw_answer
+
+	def _run_offloaded (self, conv, value):
+		"""
+		Call a slow converter in the pool, waiting for and returning the result.
+
+		While waiting, a spinner is shown if the output is a terminal. Ctrl-C
+		abandons the conversion (although the pool may still finish it) and
+		counts as a wrong answer, so the question is asked again.
+		"""
+		## Preconditions:
+		pool = self.pool or _shared_pool()
+		result = pool.apply_async (conv, (value,))
+		## Main:
+		spun = 0
+		try:
+			result.wait (SPINNER_DELAY)
+			if not result.ready():
+				isatty = getattr (self.output or sys.stdout, 'isatty', None)
+				show = bool (isatty and isatty())
+				while not result.ready():
+					if show:
+						self.write ((spun and '\b' or '') +
+							SPINNER_FRAMES[spun % len (SPINNER_FRAMES)])
+						spun += 1
+					result.wait (SPINNER_INTERVAL)
+		except KeyboardInterrupt:
+			raise ConversionError ("conversion cancelled", value)
+		finally:
+			if spun:
+				self.write ('\b \b')
+		## Postconditions & return:
+		return result.get()
+
+	def _notify (self, event, q, *args):
+		"""
+		Call the method for an event on each observer, with a timestamp.
+		"""
+		t = clock()
+		for obs in self.observers:
+			getattr (obs, event) (q, t, *args)
 
 	def _clean_text (self, text):
 		"""
@@ -368,11 +1171,11 @@ class Session (object):
 		if default_print is not None:
 			if default is '':
 				default = "''"
-			hints_str += ' %s[%s]%s' % (
-				self.set_style('HINTS'), 
-				default, 
-				self.reset_style()
-			)
+			default_str = '[%s]' % default
+			styles = self.use_styles and self._get_style_table()
+			if styles:
+				default_str = styles['HINTS'] % default_str
+			hints_str += ' ' + default_str
 		## Postconditions % return:
 		return hints_str
 	
@@ -380,56 +1183,295 @@ class Session (object):
 		"""
 		Return the necessary symbols to set styles and color.
 		"""
-		if self.use_styles:
-			return self.styles[style]
-		else:
+		tmpl = self._get_style_table().get (style)
+		if tmpl is None:
 			return ''
+		return tmpl.split ('%s')[0].replace ('%%', '%')
 		
 	def reset_style (self):
 		"""
 		Return the necessary symbols to set style back to default.
 		"""
-		if self.use_styles:
-			return defs.clr.Style.RESET_ALL
+		if self._get_style_table():
+			return defs.get_colorama().Style.RESET_ALL
 		else:
 			return ''
+
+	def _get_style_table (self):
+		"""
+		Return the styles in use, keyed by element, loading them if need be.
+
+		Each style is a template that text is formatted into (with '%'), giving
+		the text with the style set before and reset after. If styles are not
+		used or not available, this is empty. Where styles depend on the output,
+		whether it can show them is checked each time, but each table is only
+		worked out once.
+		"""
+		styled = False
+		if self.use_styles:
+			styled = (self.use_styles is not True) or \
+				defs.stream_supports_styles (self.output or sys.stdout)
+		table = self._style_tables.get (styled)
+		if table is None:
+			table = {}
+			clr = styled and defs.get_colorama()
+			if clr:
+				styles = dict (defs.get_default_styles())
+				styles.update (self.styles)
+				reset = clr.Style.RESET_ALL.replace ('%', '%%')
+				for element, code in styles.items():
+					table[element] = code.replace ('%', '%%') + '%s' + reset
+			# threads may both build a table, but the same one
+			self._style_tables[styled] = table
+		return table
 		
 		
 
-	def read_input_line (self, prompt):
+	def write (self, text):
+		"""
+		Show text to the user.
+
+		The text is written to the output stream in a single call and flushed.
+		"""
+		output = self.output or sys.stdout
+		output.write (text)
+		flush = getattr (output, 'flush', None)
+		if flush:
+			flush()
+
+	def read_input_line (self, prompt, timeout=None, completer=None,
+			history=None):
 		"""
 		Read and return a single line of user input.
 
-		Input is terminated by return or enter (which is stripped).
+		Input is terminated by return or enter (which is stripped). The prompt
+		may run over several lines, and is shown in a single write. If a timeout
+		is given and no line is read within that many seconds, `InputTimeout`
+		is raised. On the terminal (without a timeout), answers can be
+		completed by the given completer and the up arrow recalls the given
+		history, if readline is available. When a question is asked, these
+		default to the question's completer and the history of its answers.
 		"""
-		# raw_input uses readline if available
-		return raw_input(prompt + ' ')
+		if (completer is None) and (history is None) and self._local.completion:
+			completer, history = self._local.completion
+		if timeout is None:
+			if (self.input is None) and (self.output is None):
+				if (completer is None) and (history is None):
+					# raw_input uses readline if available
+					return raw_input(prompt + ' ')
+				from completion import read_line
+				return read_line (prompt + ' ', completer, history)
+			self.write (prompt + ' ')
+			line = (self.input or sys.stdin).readline()
+		else:
+			self.write (prompt + ' ')
+			line = _read_line_within (self.input or sys.stdin, timeout)
+		if not line:
+			raise EOFError()
+		return line.rstrip ('\r\n')
 
-	def read_input_multiline (self, prompt):
+	def read_input_multiline (self, prompt, timeout=None, terminator=None,
+			max_size=None, as_lines=False):
 		"""
 		Read and return multiple lines of user input.
 
-		Input is terminated by two blank lines. Input is returned as a multiline
-		string, with newlines at the linebreaks.
+		Input is terminated by two blank lines, or by the terminator line if
+		given. Input is returned as a multiline string, with newlines at the
+		linebreaks, or a list of lines if `as_lines` is true. If the first line
+		is blank, a blank string is returned. If a timeout is given, all the
+		lines must be read within that many seconds. If the text would be
+		longer than `max_size`, it is read to the end but not kept and a
+		`ConversionError` is raised.
 		"""
-		# TODO: be nice to make end condition flexible.
 		# NOTE: because raw_input can use readline, the readline up-arrow can
 		# "paste-in" multiple lines of text in one go. So a bit of post-parsing
 		# is required.
 		# NOTE: we don't even attempt to cope with anything but unix yet
-		line_arr = [self.read_input_line (prompt + ' ')]
-		if line_arr[0] == '':
-			line_arr = []
+		text = _MultilineText (terminator, max_size)
+		end = (timeout is not None) and (clock() + timeout)
+		line_prompt = prompt + ' '
+		kwargs = {}
+		while True:
+			if end:
+				kwargs['timeout'] = max (end - clock(), 0)
+			line = self.read_input_line (line_prompt, **kwargs)
+			line_prompt = '... '
+			if '\n' in line:
+				done = text.add_lines (line.split ('\n'))
+			else:
+				done = text.add (line)
+			if done:
+				return text.result (as_lines)
+
+
+class _MultilineText (object):
+	"""
+	Collects the lines of multiline text as they are read.
+	"""
+	def __init__ (self, terminator=None, max_size=None):
+		self.terminator = terminator
+		self.max_size = max_size
+		self.lines = []
+		self.size = 0
+		self.blanks = 0
+		self.started = False
+		self.too_long = False
+
+	def add (self, line):
+		"""
+		Add a line, returning whether the text is complete.
+		"""
+		if not self.started:
+			self.started = True
+			if line == '':
+				return True
+		if self.terminator is None:
+			if line == '':
+				self.blanks += 1
+				# a single blank line is only kept if more text follows
+				return self.blanks == 2
+			if self.blanks:
+				self.blanks = 0
+				self._keep ('')
+		elif line == self.terminator:
+			return True
+		self._keep (line)
+		return False
+
+	def _keep (self, line):
+		# each line is counted with a newline, though the last has none
+		self.size += len (line) + 1
+		if (self.max_size is not None) and (self.max_size < self.size - 1):
+			if not self.too_long:
+				self.too_long = True
+				# only the start of the text is kept, to report it
+				self.lines = ['\n'.join (self.lines + [line])[:self.max_size]]
 		else:
-			while True:
-				line_arr.append(self.read_input_line ('... '))
-				if line_arr[-2:] == ['', '']:
-					line_arr = line_arr[:-2]
-					break
-		clean_arr = []
-		for line in line_arr:
-			clean_arr.extend (line.split('\n'))
-		return '\n'.join (clean_arr)
+			self.lines.append (line)
+
+	def add_lines (self, lines):
+		for line in lines:
+			if self.add (line):
+				return True
+		return False
+
+	def result (self, as_lines=False):
+		"""
+		Return the completed text, as a string or list of lines.
+		"""
+		if self.too_long:
+			raise ConversionError ("text is longer than %s characters" %
+				self.max_size, self.lines[0])
+		if not self.lines:
+			return ''
+		if as_lines:
+			return self.lines
+		return '\n'.join (self.lines)
+
+
+class _Context (threading.local):
+	"""
+	The streams and answers of a session in one thread, if replaced.
+
+	Also the completer and history of the question being read, if any.
+	"""
+	input = None
+	output = None
+	answers = None
+	deadline = None
+	completion = None
+
+
+class _Using (object):
+	"""
+	Replaces the streams or answers of a thread's context, and restores them.
+	"""
+	def __init__ (self, context, **kwargs):
+		self.context = context
+		self.values = kwargs
+		self.saved = []
+
+	def __enter__ (self):
+		ctx = self.context
+		self.saved.append (dict ([(k, getattr (ctx, k)) for k in self.values]))
+		for k, v in self.values.items():
+			if v is not None:
+				setattr (ctx, k, v)
+		return self
+
+	def __exit__ (self, exc_type, exc_val, exc_tb):
+		for k, v in self.saved.pop().items():
+			setattr (self.context, k, v)
+
+
+def _read_line_within (stream, timeout):
+	"""
+	Read a line from a stream, raising `InputTimeout` if it takes too long.
+
+	The stream's file descriptor is waited on with `select` and read no
+	further than the end of the line, so the rest of the input is left to
+	the stream. Files, which never keep a reader waiting, and streams without
+	a descriptor are read as usual. Input that the stream has already read
+	into its own buffer (e.g. a pipe, after an answer read without a timeout)
+	is not seen by the wait.
+	"""
+	try:
+		fd = stream.fileno()
+		mode = os.fstat (fd).st_mode
+	except (AttributeError, IOError, OSError, ValueError):
+		return stream.readline()
+	if stat.S_ISREG (mode):
+		return stream.readline()
+	sock = None
+	if stat.S_ISSOCK (mode):
+		import socket
+		# what is waiting on a socket can be looked at without reading it
+		sock = socket.fromfd (fd, socket.AF_INET, socket.SOCK_STREAM)
+	# a terminal gives no more than a line per read, other input a byte
+	size = os.isatty (fd) and READ_SIZE or 1
+	end = clock() + timeout
+	chunks = []
+	try:
+		while True:
+			left = end - clock()
+			if (left <= 0) or (not select.select ([fd], [], [], left)[0]):
+				raise InputTimeout (None, timeout)
+			if sock is None:
+				chunk = os.read (fd, size)
+			else:
+				chunk = sock.recv (READ_SIZE, socket.MSG_PEEK)
+				if chunk:
+					chunk = sock.recv ((chunk.find ('\n') + 1) or len (chunk))
+			chunks.append (chunk)
+			if (not chunk) or chunk.endswith ('\n'):
+				return ''.join (chunks)
+	finally:
+		if sock is not None:
+			sock.close()
+
+
+def _shared_pool ():
+	"""
+	Return the thread pool shared by sessions for slow converters.
+
+	The pool is started on first use.
+	"""
+	global _offload_pool
+	with _offload_lock:
+		if _offload_pool is None:
+			from multiprocessing.pool import ThreadPool
+			_offload_pool = ThreadPool (OFFLOAD_THREADS)
+	return _offload_pool
+
+
+def _pure_konval (name, *args):
+	"""
+	Return a list of a konval validator, marked as pure.
+
+	konval is only imported when a question needs it.
+	"""
+	import konval
+	return [pure (getattr (konval, name) (*args))]
 
 
 # An always available session
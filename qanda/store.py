@@ -0,0 +1,220 @@
+"""
+Remembering answers from one run to the next.
+
+A session given an `AnswerStore` saves each accepted answer to a question
+with an id. The next time a question with that id is built, the saved answer
+becomes its default, so users need only press return to repeat their earlier
+answer::
+
+	from qanda import Session
+	s = Session (store='~/.mytool-answers')
+	host = s.string ("Which host", qid='host')
+
+In batch mode (i.e. a session with an answer source), questions with a saved
+answer can be skipped entirely by also passing `trust_store=True`.
+
+Where a dbm module that updates a file in place is available (bsddb, gdbm or
+ndbm), the store is a dbm file. Otherwise it is a log that each change is
+appended to. Either way, saving an answer writes it out at once without
+rewriting the whole file, even with many thousands of questions.
+"""
+
+__docformat__ = "restructuredtext en"
+
+
+### IMPORTS
+
+import os
+import threading
+
+__all__ = [
+	'AnswerStore',
+]
+
+
+### CONSTANTS & DEFINES
+
+# the dbm modules that update a file in place, in the order anydbm tries them
+DBM_MODULES = ['dbhash', 'gdbm', 'dbm']
+
+# a log is rewritten when opened if it has more than this many lines, and
+# more than twice as many as there are answers
+COMPACT_LINES = 1000
+
+
+### IMPLEMENTATION ###
+
+class AnswerStore (object):
+	"""
+	A persistent store of raw answers, keyed by question id.
+
+	Answers are stored as they were typed (after stripping), so they can be
+	used as a default and converted again.
+	"""
+
+	def __init__ (self, path):
+		"""
+		C'tor.
+
+		:Parameters:
+			path
+				The path of the store. This is created if it doesn't exist. Some
+				dbm implementations add an extension to this.
+		"""
+		self.path = os.path.expanduser (path)
+		self._db = _open_dbm (self.path) or _AnswerLog (self.path)
+
+	def get (self, qid, default=None):
+		"""
+		Return the saved answer for a question id, or the default if none.
+		"""
+		try:
+			return self._db[_to_bytes (qid)]
+		except KeyError:
+			return default
+
+	def put (self, qid, raw_answer):
+		"""
+		Save the answer to a question.
+		"""
+		self._db[_to_bytes (qid)] = _to_bytes (raw_answer)
+
+	def __contains__ (self, qid):
+		return self._db.has_key (_to_bytes (qid))
+
+	def __delitem__ (self, qid):
+		del self._db[_to_bytes (qid)]
+
+	def __len__ (self):
+		return len (self._db)
+
+	def sync (self):
+		"""
+		Write out any buffered answers, if the dbm implementation buffers.
+		"""
+		if hasattr (self._db, 'sync'):
+			self._db.sync()
+
+	def close (self):
+		"""
+		Save and close the store. It can't be used after this.
+		"""
+		self._db.close()
+
+	def __enter__ (self):
+		return self
+
+	def __exit__ (self, exc_type, exc_val, exc_tb):
+		self.close()
+
+
+class _AnswerLog (object):
+	"""
+	Answers kept as a log of changes, where no suitable dbm module is available.
+
+	Each change is appended to the file as a line and flushed, so it is kept
+	even if the store is never closed. The file is read when opened, and
+	rewritten without the lines since superseded if they are most of it.
+	"""
+
+	def __init__ (self, path):
+		self.path = path
+		self.data = {}
+		lines = 0
+		cut_short = False
+		if os.path.exists (path):
+			with open (path, 'rb') as in_hndl:
+				for line in in_hndl:
+					if not line.endswith ('\n'):
+						# the last change was never finished, e.g. after a crash
+						cut_short = True
+						break
+					lines += 1
+					key, tab, value = line[:-1].partition ('\t')
+					key = key.decode ('string_escape')
+					if tab:
+						self.data[key] = value.decode ('string_escape')
+					else:
+						self.data.pop (key, None)
+		superseded = (COMPACT_LINES < lines) and (2 * len (self.data) < lines)
+		if cut_short or superseded:
+			self._rewrite()
+		self._file = open (path, 'ab')
+		self._lock = threading.Lock()
+
+	def __getitem__ (self, key):
+		return self.data[key]
+
+	def __setitem__ (self, key, value):
+		self._append ('%s\t%s\n' % (key.encode ('string_escape'),
+			value.encode ('string_escape')))
+		self.data[key] = value
+
+	def __delitem__ (self, key):
+		del self.data[key]
+		self._append ('%s\n' % key.encode ('string_escape'))
+
+	def has_key (self, key):
+		return key in self.data
+
+	def __len__ (self):
+		return len (self.data)
+
+	def sync (self):
+		self._file.flush()
+
+	def close (self):
+		self._file.close()
+
+	def _append (self, line):
+		with self._lock:
+			self._file.write (line)
+			self._file.flush()
+
+	def _rewrite (self):
+		# written aside and renamed over the log, so it is never left half done
+		tmp_path = self.path + '.tmp'
+		with open (tmp_path, 'wb') as out_hndl:
+			for key, value in self.data.iteritems():
+				out_hndl.write ('%s\t%s\n' % (key.encode ('string_escape'),
+					value.encode ('string_escape')))
+		os.rename (tmp_path, self.path)
+
+
+def _open_dbm (path):
+	"""
+	Open a dbm file that is updated in place, or return None if there is none.
+
+	An existing file is opened with the module that made it. A new file is
+	made with the first of `DBM_MODULES` available. dumbdbm, which anydbm
+	falls back to, is not used as it rewrites its index on every change.
+	"""
+	import whichdb
+	kind = whichdb.whichdb (path)
+	if kind is None:
+		# there is no file yet
+		names = DBM_MODULES
+	elif kind in DBM_MODULES:
+		names = [kind]
+	else:
+		return None
+	for name in names:
+		try:
+			module = __import__ (name)
+		except ImportError:
+			continue
+		return module.open (path, 'c')
+	return None
+
+
+def _to_bytes (val):
+	"""
+	Return a question id or answer as a byte string, as dbm requires.
+	"""
+	if isinstance (val, unicode):
+		return val.encode ('utf-8')
+	return str (val)
+
+
+
+### END #######################################################################
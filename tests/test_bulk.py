@@ -0,0 +1,42 @@
+"""
+Tests for validating many answers at once.
+"""
+
+__docformat__ = "restructuredtext en"
+
+
+### IMPORTS
+
+from qanda import Session
+
+
+### CONSTANTS & DEFINES
+
+### IMPLEMENTATION ###
+
+class TestValidateMany (object):
+
+	def setup (self):
+		self.session = Session (use_styles=False)
+
+	def test_numbers (self):
+		q = self.session.compile ('integer', "How many", min=0, max=10)
+		values, mask = self.session.validate_many (q, [1, '2', 11, 2.5])
+		assert values == [1, 2, None, None]
+		assert list (mask) == [0, 0, 1, 1]
+
+	def test_missing (self):
+		q = self.session.compile ('string', "Which host")
+		values, mask = self.session.validate_many (q, ['a', None, 3])
+		assert values == ['a', None, '3']
+		assert list (mask) == [0, 1, 0]
+
+	def test_missing_with_default (self):
+		q = self.session.compile ('integer', "How many", default='4')
+		values, mask = self.session.validate_many (q, [None, 5])
+		assert values == [4, 5]
+		assert list (mask) == [0, 0]
+
+
+
+### END #######################################################################
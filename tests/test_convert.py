@@ -0,0 +1,52 @@
+"""
+Tests for converter chains and their caches.
+"""
+
+__docformat__ = "restructuredtext en"
+
+
+### IMPORTS
+
+import sys
+import threading
+
+from qanda.convert import ConverterChain, pure
+
+
+### CONSTANTS & DEFINES
+
+THREADS = 8
+CALLS = 2000
+CACHE_SIZE = 8
+
+
+### IMPLEMENTATION ###
+
+class TestConverterChain (object):
+
+	def test_cache_shared_by_threads (self):
+		chain = ConverterChain ([pure (int)], CACHE_SIZE)
+		wrong = []
+		def work (k):
+			for i in xrange (CALLS):
+				n = (i * k) % (CACHE_SIZE * 3)
+				if chain (str (n)) != n:
+					wrong.append (n)
+		threads = [threading.Thread (target=work, args=(k + 1,))
+			for k in xrange (THREADS)]
+		interval = sys.getcheckinterval()
+		# switch threads as often as possible
+		sys.setcheckinterval (1)
+		try:
+			for t in threads:
+				t.start()
+			for t in threads:
+				t.join()
+		finally:
+			sys.setcheckinterval (interval)
+		assert not wrong
+		assert len (chain._cache) <= CACHE_SIZE
+
+
+
+### END #######################################################################
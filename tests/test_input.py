@@ -0,0 +1,133 @@
+"""
+Tests for reading answers from streams, with and without timeouts.
+
+Only the line answered should be read from a stream, so what follows is left
+for whatever reads the stream next.
+"""
+
+__docformat__ = "restructuredtext en"
+
+
+### IMPORTS
+
+import os
+import sys
+import socket
+import tempfile
+import subprocess
+from StringIO import StringIO
+
+from qanda import Session, InputTimeout
+
+
+### CONSTANTS & DEFINES
+
+TIMEOUT = 5.0
+
+# answer a question from stdin with the default session, then read the rest
+READ_REST = "from qanda import prompt; import sys; " \
+	"print repr (prompt.string ('name')); print repr (sys.stdin.read())"
+
+
+### IMPLEMENTATION ###
+
+class ScriptedSession (Session):
+	"""
+	A session reading answers as subclasses did before readers took options.
+	"""
+	def __init__ (self, lines):
+		Session.__init__ (self, output=StringIO(), use_styles=False)
+		self.lines = list (lines)
+
+	def read_input_line (self, prompt):
+		return self.lines.pop (0)
+
+
+class TestInput (object):
+
+	def setup (self):
+		fd, self.path = tempfile.mkstemp()
+		os.write (fd, 'alice\nbob\nrest of data\n')
+		os.close (fd)
+		self.closing = []
+
+	def teardown (self):
+		for f in self.closing:
+			f.close()
+		os.remove (self.path)
+
+	def session (self, input):
+		self.closing.append (input)
+		return Session (input=input, output=StringIO(), use_styles=False)
+
+	def pipe (self, data):
+		r, w = os.pipe()
+		os.write (w, data)
+		os.close (w)
+		return os.fdopen (r)
+
+	def test_piped_stdin (self):
+		env = dict (os.environ)
+		env['PYTHONPATH'] = os.path.dirname (os.path.dirname (
+			os.path.abspath (__file__)))
+		proc = subprocess.Popen ([sys.executable, '-c', READ_REST], env=env,
+			stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+		out = proc.communicate ('alice\nrest of data\n')[0]
+		# the prompt is shown before the first line
+		assert out.endswith ("'alice'\n'rest of data\\n'\n")
+
+	def test_file_already_read (self):
+		f = open (self.path)
+		f.readline()
+		s = self.session (f)
+		assert s.string ("name") == 'bob'
+		assert f.read() == 'rest of data\n'
+
+	def test_file_with_timeout (self):
+		f = open (self.path)
+		s = self.session (f)
+		assert s.string ("name") == 'alice'
+		assert s.string ("name", timeout=TIMEOUT) == 'bob'
+		assert f.read() == 'rest of data\n'
+
+	def test_pipe_with_timeout (self):
+		f = self.pipe ('alice\nbob\nrest of data\n')
+		s = self.session (f)
+		assert s.string ("name", timeout=TIMEOUT) == 'alice'
+		assert s.string ("name", timeout=TIMEOUT) == 'bob'
+		assert f.read() == 'rest of data\n'
+
+	def test_pipe_timeout (self):
+		r, w = os.pipe()
+		f = os.fdopen (r)
+		self.closing.append (os.fdopen (w, 'w'))
+		s = self.session (f)
+		try:
+			s.string ("name", timeout=0.05)
+		except InputTimeout:
+			pass
+		else:
+			assert False, "no timeout"
+		assert s.string ("name", timeout=0.05, default='bob') == 'bob'
+
+	def test_socket (self):
+		a, b = socket.socketpair()
+		self.closing.append (b)
+		a.sendall ('alice\nbob\nrest of data\n')
+		a.close()
+		rfile = b.makefile ('r')
+		s = self.session (rfile)
+		assert s.string ("name", timeout=TIMEOUT) == 'alice'
+		assert s.string ("name") == 'bob'
+		assert rfile.read() == 'rest of data\n'
+
+	def test_overridden_reader (self):
+		s = ScriptedSession (['5', 'x', 'some', 'text', '', '', 'b'])
+		assert s.integer ("How many", qid='n') == 5
+		assert s.string ("name") == 'x'
+		assert s.text ("notes") == 'some\ntext'
+		assert s.long_choice ("Which", ['a', 'b'], page_size=1) == 'b'
+
+
+
+### END #######################################################################
@@ -0,0 +1,92 @@
+"""
+Tests for observing sessions.
+"""
+
+__docformat__ = "restructuredtext en"
+
+
+### IMPORTS
+
+import sys
+import threading
+from StringIO import StringIO
+
+from qanda import Session, Observer, MetricsObserver
+from qanda.history import AnswerHistory
+
+
+### CONSTANTS & DEFINES
+
+THREADS = 8
+ASKS = 500
+
+
+### IMPLEMENTATION ###
+
+class BrokenObserver (Observer):
+	def converter_end (self, q, t, conv, value):
+		raise KeyError ('broken observer')
+
+
+class TestObservers (object):
+
+	def session (self, answers):
+		self.output = StringIO()
+		return Session (input=StringIO (answers), output=self.output,
+			use_styles=False)
+
+	def test_observer_error_is_not_a_bad_answer (self):
+		s = self.session ('5\n5\n')
+		s.add_observer (BrokenObserver())
+		try:
+			s.integer ("How many")
+		except KeyError:
+			pass
+		else:
+			assert False, "observer error was lost"
+		# asked once, with no complaint about the answer
+		assert self.output.getvalue() == 'How many: '
+
+	def test_empty_history_given (self):
+		history = AnswerHistory()
+		s = Session (input=StringIO ('5\n'), output=StringIO(), history=history)
+		assert s.history is history
+		s.integer ("How many")
+		assert len (history) == 1
+
+	def test_threads_asking_one_question (self):
+		s = Session (use_styles=False, history=True)
+		metrics = MetricsObserver()
+		s.add_observer (metrics)
+		q = s.compile ('integer', "How many", qid='n')
+		wrong = []
+		def work (k):
+			for i in xrange (ASKS):
+				n = i * k
+				# one wrong answer, then the right one
+				with s.use (input=StringIO ('x\n%s\n' % n), output=StringIO()):
+					if q.ask() != n:
+						wrong.append (n)
+		threads = [threading.Thread (target=work, args=(k,))
+			for k in xrange (THREADS)]
+		interval = sys.getcheckinterval()
+		# switch threads as often as possible
+		sys.setcheckinterval (1)
+		try:
+			for t in threads:
+				t.start()
+			for t in threads:
+				t.join()
+		finally:
+			sys.setcheckinterval (interval)
+		assert not wrong
+		report = metrics.report()['n']
+		assert report['answers'] == THREADS * ASKS
+		assert report['retries'] == THREADS * ASKS
+		assert len (s.history) == THREADS * ASKS
+		for rec in s.history:
+			assert (rec.attempts == 2) and (rec.raw == str (rec.value))
+
+
+
+### END #######################################################################
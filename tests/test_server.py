@@ -0,0 +1,143 @@
+"""
+Tests for serving conversations over a socket, through a loopback client.
+"""
+
+__docformat__ = "restructuredtext en"
+
+
+### IMPORTS
+
+import threading
+
+from qanda.server import PromptServer, PromptClient, ServerError, MAX_LINE
+
+
+### CONSTANTS & DEFINES
+
+TIMEOUT = 5.0
+
+
+### IMPLEMENTATION ###
+
+def setup_conversation (session):
+	host = yield session.string ("Which host", qid='host')
+	port = yield session.integer ("Which port", min=1, max=65535)
+	raise StopIteration ({'host': host, 'port': port})
+
+
+def timed_conversation (session):
+	host = yield session.string ("Which host", default='localhost',
+		timeout=0.05)
+	port = yield session.integer ("Which port", timeout=0.05)
+	raise StopIteration ({'host': host, 'port': port})
+
+
+def broken_conversation (session):
+	raise RuntimeError ("broken before the first question")
+
+
+class TestPromptServer (object):
+
+	def setup (self):
+		self.server = PromptServer (('127.0.0.1', 0), {
+			'setup': setup_conversation,
+			'broken': broken_conversation,
+			'timed': timed_conversation,
+		})
+		self.thread = threading.Thread (target=self.server.serve_forever,
+			args=(0.05,))
+		self.thread.daemon = True
+		self.thread.start()
+		self.clients = []
+
+	def teardown (self):
+		for c in self.clients:
+			c.close()
+		self.server.shutdown()
+		self.thread.join (TIMEOUT)
+		self.server.close()
+
+	def connect (self):
+		client = PromptClient (self.server.address, TIMEOUT)
+		self.clients.append (client)
+		return client
+
+	def test_run (self):
+		transcript = []
+		result = self.connect().run ('setup', ['localhost', '8080'], transcript)
+		assert result == {'host': 'localhost', 'port': 8080}
+		assert transcript == ['Which host: ', 'Which port: ']
+
+	def test_retry (self):
+		client = self.connect()
+		result = client.run ('setup', ['localhost', 'http', '0', '80'])
+		assert result == {'host': 'localhost', 'port': 80}
+
+	def test_many_conversations (self):
+		client = self.connect()
+		for port in (1, 2, 3):
+			result = client.run ('setup', ['h', str (port)])
+			assert result['port'] == port
+
+	def test_unknown_conversation (self):
+		client = self.connect()
+		try:
+			client.run ('nonesuch', [])
+		except ServerError, err:
+			assert 'nonesuch' in str (err)
+		else:
+			assert False, "unknown conversation was started"
+
+	def test_bad_messages (self):
+		client = self.connect()
+		for msg in ({'start': []}, {'start': {'a': 1}}, {'answer': 'x'},
+				{'foo': 1}):
+			client.send (msg)
+			assert client.receive()['type'] == 'ServerError'
+		client.sock.sendall ('not json\n')
+		assert client.receive()['type'] == 'ServerError'
+		# the server and connection are still usable
+		assert self.connect().run ('setup', ['h', '1'])['port'] == 1
+		assert client.run ('setup', ['h', '2'])['port'] == 2
+
+	def test_long_message (self):
+		client = self.connect()
+		client.sock.sendall ('x' * (MAX_LINE + 1))
+		assert client.receive()['type'] == 'ServerError'
+		# the rest of the message is dropped, up to its end
+		client.sock.sendall ('x' * 100 + '\n')
+		assert client.run ('setup', ['h', '2'])['port'] == 2
+
+	def test_failing_conversation (self):
+		client = self.connect()
+		client.start ('broken')
+		msg = client.receive()
+		assert msg['type'] == 'RuntimeError'
+		assert self.connect().run ('setup', ['h', '1'])['port'] == 1
+		assert client.run ('setup', ['h', '2'])['port'] == 2
+
+	def test_silent_client (self):
+		client = self.connect()
+		client.start ('timed')
+		prompts = []
+		msg = client.receive()
+		while 'out' in msg:
+			prompts.append (msg['out'])
+			msg = client.receive()
+		# the first question takes its default, the second has none
+		assert prompts[-2:] == ['Which port: ', '\n']
+		assert msg['type'] == 'InputTimeout'
+		assert client.run ('setup', ['h', '2'])['port'] == 2
+
+	def test_answer_must_be_string (self):
+		client = self.connect()
+		client.start ('setup')
+		client.receive()
+		client.answer (['localhost'])
+		assert client.receive()['type'] == 'ServerError'
+		client.answer ('localhost')
+		assert 'out' in client.receive()
+
+
+
+### END #######################################################################
@@ -0,0 +1,80 @@
+"""
+Tests for remembering answers from one run to the next.
+"""
+
+__docformat__ = "restructuredtext en"
+
+
+### IMPORTS
+
+import os
+import shutil
+import tempfile
+from StringIO import StringIO
+
+from qanda import Session
+from qanda.store import AnswerStore, _AnswerLog, COMPACT_LINES
+
+
+### CONSTANTS & DEFINES
+
+### IMPLEMENTATION ###
+
+class TestAnswerStore (object):
+
+	def setup (self):
+		self.dir = tempfile.mkdtemp()
+		self.path = os.path.join (self.dir, 'answers')
+
+	def teardown (self):
+		shutil.rmtree (self.dir)
+
+	def test_kept_without_close (self):
+		s = Session (input=StringIO ('example.com\n'), output=StringIO(),
+			store=self.path)
+		s.string ("Which host", qid='host')
+		# as if the process had ended, without closing the store
+		store = AnswerStore (self.path)
+		assert store.get ('host') == 'example.com'
+		store.close()
+
+	def test_changes (self):
+		with AnswerStore (self.path) as store:
+			store.put ('a', '1')
+			store.put ('b', 'two\tlines\nand a \\')
+			store.put ('a', '3')
+			del store['b']
+			store.put (u'caf\xe9', u'cr\xe8me')
+		with AnswerStore (self.path) as store:
+			assert len (store) == 2
+			assert store.get ('a') == '3'
+			assert 'b' not in store
+			assert store.get (u'caf\xe9') == u'cr\xe8me'.encode ('utf-8')
+
+	def test_log_cut_short (self):
+		log = _AnswerLog (self.path)
+		log['a'] = '1'
+		log.close()
+		with open (self.path, 'ab') as out_hndl:
+			out_hndl.write ('b\tunfinis')
+		log = _AnswerLog (self.path)
+		log['c'] = '2'
+		log.close()
+		log = _AnswerLog (self.path)
+		assert log.data == {'a': '1', 'c': '2'}
+		log.close()
+
+	def test_log_rewritten (self):
+		log = _AnswerLog (self.path)
+		for i in xrange (COMPACT_LINES + 1):
+			log['a'] = str (i)
+		log.close()
+		log = _AnswerLog (self.path)
+		assert log['a'] == str (COMPACT_LINES)
+		log.close()
+		with open (self.path, 'rb') as in_hndl:
+			assert len (in_hndl.readlines()) == 1
+
+
+
+### END #######################################################################